@@ -5,7 +5,13 @@ from enum import Enum
 import os
 import scripts.math_util as math_util
 import scripts.main as core
+import scripts.tablebase as tablebase
+from scripts.asset_manager import assets, transform_cache
 from scripts.animation import *
+from scripts.frame_clock import frame_clock
+from scripts.time_scale import time_scale, NORMAL, FAST, FASTER, INSTANT
+from scripts.render import DirtyRectRenderer, submit, BACKGROUND_LAYER, DEFAULT_LAYER, UI_LAYER
+from scripts.layout import WINDOW_WIDTH, WINDOW_HEIGHT, LABEL_SCALES
 
 # Create __init__.py in the scripts directory if it doesn't exist
 scripts_dir = os.path.join(os.getcwd(), 'scripts')
@@ -18,8 +24,7 @@ if not os.path.exists(init_file):
 print(f"Created {init_file}")
 
 #Shanti change the screen size to make it easier for arranging cards in three player screen
-WINDOW_WIDTH = 900
-WINDOW_HEIGHT = 675
+# WINDOW_WIDTH and WINDOW_HEIGHT are in scripts.layout, the asset pipeline pre-scales the backgrounds to them
 UNI_SCALE = WINDOW_HEIGHT/3546
 
 # Card spacing constants
@@ -31,6 +36,20 @@ STACK_OFFSET = 15  # Offset for stacked cards
 
 game_over = False
 current_screen = None
+# posted when the game logic schedules a job, so that a waiting main loop wakes up at once
+JOB_SCHEDULED_EVENT = pygame.USEREVENT + 1
+# the longest time the main loop waits for input while nothing changes, in milliseconds
+IDLE_WAIT_TIMEOUT = 1000
+
+# keys that change the speed of the game on any screen
+TIME_SCALE_KEYS = {K_F1: NORMAL, K_F2: FAST, K_F3: FASTER, K_F4: INSTANT}
+PAUSE_KEY = K_PAUSE
+SKIP_AI_ANIMATIONS_KEY = K_F5
+
+# generated offline by running: python -m scripts.atlas
+CARD_ATLAS_PATH = "resources/atlas/cards.json"
+# generated offline by running: python -m scripts.asset_pipeline
+PRESCALED_MANIFEST_PATH = "resources/prescaled/manifest.json"
 
 
 def change_screen(screen_instance):
@@ -38,6 +57,39 @@ def change_screen(screen_instance):
     current_screen = screen_instance
 
 
+def create_ai_player_input():
+    """AI players play the endgame from the tablebase when it has been generated by: python -m scripts.tablebase"""
+    if tablebase.open_tablebase() is None:
+        return core.AIPlayerInput()
+    return tablebase.TablebasePlayerInput()
+
+
+# the surfaces drawn every frame without an owner are compared by identity, see scripts.render, so they are made once
+# (size, text, colour) -> rendered text
+_text_surfaces = {}
+# (colour, angle) -> highlight drawn under a card
+_highlight_surfaces = {}
+
+
+def render_text(text, size, color=(255, 255, 255)):
+    key = (size, text, color)
+    if key not in _text_surfaces:
+        _text_surfaces[key] = pygame.font.Font(None, size).render(text, True, color)
+    return _text_surfaces[key]
+
+
+def highlight_surface(color, angle):
+    key = (color, angle)
+    if key not in _highlight_surfaces:
+        highlight = pygame.Surface((CARD_WIDTH + 2, CARD_HEIGHT + 2))
+        highlight.set_alpha(150)
+        highlight.fill(color)
+        if angle != 0:
+            highlight = pygame.transform.rotate(highlight, angle)
+        _highlight_surfaces[key] = highlight
+    return _highlight_surfaces[key]
+
+
 def load_and_scale_image(image_path, scale_factor=0.2):
     """Memuat gambar dan mengubah ukurannya berdasarkan scale_factor."""
     img = pygame.image.load(image_path)
@@ -64,15 +116,86 @@ def pop_up_buttons(button_list, pretime = 0, posttime = 1):
         pretime += 0.1
         posttime -= 0.1
 
+# bits of VisualObject.dirty, set when the property has been given a different value
+DIRTY_POSITION = 1
+DIRTY_SCALE = 2
+DIRTY_ROTATION = 4
+DIRTY_ALPHA = 8
+DIRTY_IMAGE = 16
+DIRTY_VISIBLE = 32
+# the changes that need the image to be resampled
+DIRTY_TRANSFORM = DIRTY_SCALE | DIRTY_ROTATION | DIRTY_ALPHA | DIRTY_IMAGE
+DIRTY_ALL = DIRTY_POSITION | DIRTY_TRANSFORM | DIRTY_VISIBLE
+
+
 class VisualObject:
+    # objects of a higher layer are drawn on top, see scripts.render
+    layer = DEFAULT_LAYER
+
     def __init__(self, position2d=(0, 0), scale2d=(1, 1), rotation2d=(1, 0), alpha=255):
-        self.position2d = position2d
-        self.scale2d = scale2d
-        self.rotation2d = rotation2d
-        self.alpha = alpha
-        self.visible = True
+        # the transform is only read through the properties, so that a change is noticed without comparing values
+        # every frame, dirty holds the changes that have not been drawn yet and is cleared by draw
+        self.dirty = DIRTY_ALL
+        self._position2d = position2d
+        self._scale2d = scale2d
+        self._rotation2d = rotation2d
+        self._alpha = alpha
+        self._visible = True
         pass
 
+    def _mark_dirty(self, bits):
+        self.dirty |= bits
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, value):
+        if value != self._visible:
+            self._visible = value
+            self._mark_dirty(DIRTY_VISIBLE)
+
+    @property
+    def position2d(self):
+        return self._position2d
+
+    @position2d.setter
+    def position2d(self, value):
+        if value != self._position2d:
+            self._position2d = value
+            self._mark_dirty(DIRTY_POSITION)
+
+    @property
+    def scale2d(self):
+        return self._scale2d
+
+    @scale2d.setter
+    def scale2d(self, value):
+        if value != self._scale2d:
+            self._scale2d = value
+            self._mark_dirty(DIRTY_SCALE)
+
+    @property
+    def rotation2d(self):
+        return self._rotation2d
+
+    @rotation2d.setter
+    def rotation2d(self, value):
+        if value != self._rotation2d:
+            self._rotation2d = value
+            self._mark_dirty(DIRTY_ROTATION)
+
+    @property
+    def alpha(self):
+        return self._alpha
+
+    @alpha.setter
+    def alpha(self, value):
+        if value != self._alpha:
+            self._alpha = value
+            self._mark_dirty(DIRTY_ALPHA)
+
     @property
     def euler_angle(self):
         return math_util.rotation_to_euler_angle(self.rotation2d)
@@ -83,7 +206,7 @@ class VisualObject:
         self.rotation2d = value
 
     def draw(self, screen):
-        pass
+        self.dirty = 0
 
     def update(self):
         pass
@@ -96,24 +219,52 @@ class RenderableImage(VisualObject):
     '''
     A class that provide basic rendering functionality for images along with transformation (position, scale, rotation)
     '''
+    # degrees between two rendered frames of a rotation, None uses the default of the transform cache
+    ANGLE_STEP = None
 
     def __init__(self, image_src, position2d=(0, 0), scale2d=(1, 1), rotation2d=(1, 0), alpha=255):
         super().__init__(position2d=position2d, scale2d=scale2d, rotation2d=rotation2d, alpha=alpha)
-        self.image_src = image_src
-        self._cached_src_image_dict = {}
+        self._image_src = image_src
         self._store_cache()
 
+    @property
+    def image_src(self):
+        return self._image_src
+
+    @image_src.setter
+    def image_src(self, value):
+        if value != self._image_src:
+            self._image_src = value
+            self._mark_dirty(DIRTY_IMAGE)
+
+    def _mark_dirty(self, bits):
+        super()._mark_dirty(bits)
+        # the transformed image catches up on its own, the bounds can be asked for before the object is drawn
+        self._cache_dirty |= bits
+
     @property
     def image(self):
-        if self.image_src not in self._cached_src_image_dict.keys():
-            self._update_cache_if_dirty()
-        return self._cached_src_image_dict[self.image_src]
+        # the source surface is decoded once and shared by every object using the same file
+        return assets.load(self.image_src)
 
     def _transform_image(self):
+        # objects showing the same image with the same transform share the transformed surface
+        angle = math_util.rotation_to_euler_angle(self.rotation2d)
+        key = transform_cache.make_key(self.image_src, self._size2d(), angle, self.alpha, self.ANGLE_STEP)
+        (image_src, size2d, angle, alpha) = key
+        return transform_cache.get(key, lambda: self._resample_image(size2d, angle, alpha))
+
+    def _resample_image(self, size2d, angle, alpha):
+        if angle == 0:
+            # pre-scaled to exactly this size by scripts.asset_pipeline, nothing to resample
+            exact_image = assets.load_exact(self.image_src, size2d)
+            if exact_image is not None:
+                transformed_image = exact_image.copy()
+                transformed_image.set_alpha(alpha)
+                return transformed_image
         # basically follows the order of SQT scale->rotation->translation
-        size2d = self._size2d()
         scale2d = self.scale2d
-        original_size2d = self.image.get_size()
+        original_size2d = assets.image_size(self.image_src)
         # this is a simple super sampler anti-aliasing
         # rotation will severely corrupt the original image sample result, so do the pre scale before it is rotated
         preprocess_size2d = original_size2d
@@ -125,56 +276,80 @@ class RenderableImage(VisualObject):
             preprocess_size2d = (original_size2d[0], target_height)
         # point scale, also known as 1d scale
         scale_ratio = size2d[1] / preprocess_size2d[1]
+        # a pre-scaled level that is still larger than the result keeps the super sampling with fewer pixels
+        source_image = assets.load_for_size(self.image_src, (preprocess_size2d[0] * scale_ratio, size2d[1]))
+        level_ratio = source_image.get_height() / original_size2d[1]
+        preprocess_size2d = (preprocess_size2d[0] * level_ratio, preprocess_size2d[1] * level_ratio)
+        scale_ratio = size2d[1] / preprocess_size2d[1]
         # in the following step we get the super sampled picture
-        transformed_image = pygame.transform.scale(self.image, preprocess_size2d)
-        angle = math_util.rotation_to_euler_angle(self.rotation2d)
+        transformed_image = pygame.transform.scale(source_image, preprocess_size2d)
         transformed_image = pygame.transform.rotate(transformed_image, angle)
         rect = transformed_image.get_rect()
         # finally scale the image to given size
         transformed_image = pygame.transform.smoothscale(transformed_image,
                                                          (rect.width * scale_ratio, rect.height * scale_ratio))
         # t (not needed to be processed here)
-        transformed_image.set_alpha(self.alpha)
+        transformed_image.set_alpha(alpha)
         return transformed_image
 
     # calculate the size using given scale. e.g. the original image is 100*100, scale (2,2) will make the size 200*200
     # scale is always (1,1) when using the original size
     def _size2d(self):
-        x = self.image.get_size()[0] * self.scale2d[0]
-        y = self.image.get_size()[1] * self.scale2d[1]
+        (width, height) = assets.image_size(self.image_src)
+        x = width * self.scale2d[0]
+        y = height * self.scale2d[1]
         return x, y
 
+    def _draw_position(self):
+        # where the center of the image is drawn, subclasses may offset it from position2d
+        return self.position2d
+
     # cache the transformed image so that it won't be resampled every frame
     def _store_cache(self):
-        self._cached_image_src = self.image_src
-        if self.image_src not in self._cached_src_image_dict.keys():
-            self._cached_src_image_dict[self.image_src] = pygame.image.load(self.image_src).convert_alpha()
         self._cached_transformed_image = self._transform_image()
-        self._cached_size2d = self._size2d()
-        self._cached_rotation2d = self.rotation2d
-        self._cached_alpha = self.alpha
+        self._cached_rect = self._cached_transformed_image.get_rect(center=self._draw_position())
+        self._cache_dirty = 0
 
     # when properties changed e.g. scale or the whole image src, it requires a resample, which means update the cache
     def _update_cache_if_dirty(self):
-        if self.image_src != self._cached_image_src:
-            self._store_cache()
-        elif self._cached_size2d != self._size2d() or self.rotation2d != self._cached_rotation2d or self.alpha != self._cached_alpha:
+        if self._cache_dirty & DIRTY_TRANSFORM:
             self._store_cache()
+        elif self._cache_dirty & DIRTY_POSITION:
+            # only moved, the image is still right
+            self._cached_rect = self._cached_transformed_image.get_rect(center=self._draw_position())
+        self._cache_dirty = 0
 
     def draw(self, screen):
+        changed = self.dirty != 0
+        self.dirty = 0
         if not self.visible:
             return
+        if self._cache_dirty:
+            self._update_cache_if_dirty()
+        submit(screen, self._cached_transformed_image, self._cached_rect.topleft, self.layer, owner=self,
+               changed=changed)
+
+    def bounds(self):
+        """
+        :return: the rect the object covers when it is drawn
+        """
         self._update_cache_if_dirty()
-        rect = self._cached_transformed_image.get_rect(center=self.position2d)
-        screen.blit(self._cached_transformed_image, rect.topleft)
+        return self._cached_rect.copy()
 
     def update(self):
         pass
 
 
+def check_label_scale(image_path, scale_factor):
+    # the label images are pre-scaled to exact sizes only for the factors listed in scripts.layout
+    if scale_factor not in LABEL_SCALES.get(image_path, ()):
+        print(f"Warning: {image_path} at scale {scale_factor} is missing from LABEL_SCALES, it is resampled at runtime")
+
+
 class Label(RenderableImage):
     # if it's image instead of text:
     def __init__(self, image_path, pos, scale_factor=0.2):
+        check_label_scale(image_path, scale_factor)
         super().__init__(image_path, pos, (scale_factor, scale_factor), (1, 0), 255)
 
     @property
@@ -203,7 +378,7 @@ class Label(RenderableImage):
 
     @width.setter
     def width(self, width):
-        scale_x = self.image.get_width() / width
+        scale_x = assets.image_size(self.image_src)[0] / width
         scale_y = self.scale2d[1]
         self.scale2d = (scale_x, scale_y)
 
@@ -213,14 +388,17 @@ class Label(RenderableImage):
 
     @height.setter
     def height(self, height):
-        scale_y = self.image.get_height() / height
+        scale_y = assets.image_size(self.image_src)[1] / height
         scale_x = self.scale2d[0]
         self.scale2d = (scale_x, scale_y)
 
 
 class ClickableLabel(Label):
+    layer = UI_LAYER
+
     def __init__(self, image_path1, image_path2, pos, scale_factor=0.2):
         super().__init__(image_path1, pos, scale_factor)  # Pass scale_factor to parent
+        check_label_scale(image_path2, scale_factor)
         self.image_path1 = image_path1  # pict for normal(without click)
         self.image_path2 = image_path2  # pict for hover
         self.img_src_normal = self.image_path1
@@ -423,6 +601,10 @@ class DeckLabel(ClickableLabel):
         global current_screen
 
 class Card(RenderableImage):
+    # a turning card shows the nearest of the frames rendered every 5 degrees, so a rotation tween only blits
+    # frames from the transform cache once each frame has been rendered
+    ANGLE_STEP = 5
+
     def __init__(self, color, number, position2d=(0, 0), scale2d=(0.15, 0.15), rotation2d=(1, 0)):
         # For face-up cards
         self.face_up_image = f"resources/images/cards/{color}_{number}.png"
@@ -431,6 +613,8 @@ class Card(RenderableImage):
         # Start with face-down image
         image_path = self.face_down_image
         self.logic_card = None
+        # the image is drawn raised by this much, see _draw_position
+        self._hover_offset = 0
 
         super().__init__(image_path, position2d, scale2d, rotation2d)
         self.color = color
@@ -442,30 +626,43 @@ class Card(RenderableImage):
         self.hover_offset = 0
         self.HOVER_DISTANCE = -20  # Distance to raise card
         self.RAISED_HORIZONTAL_OFFSET = 20  # Additional horizontal spacing for raised cards
+        # property name -> (task, target) of the last tween started by update_position or update_rotation
+        self._tweens = {}
 
         self.rect = pygame.Rect(position2d[0] - CARD_WIDTH / 2,
                                 position2d[1] - CARD_HEIGHT / 2,
                                 CARD_WIDTH, CARD_HEIGHT)
 
+    @property
+    def hover_offset(self):
+        return self._hover_offset
+
+    @hover_offset.setter
+    def hover_offset(self, value):
+        if value != self._hover_offset:
+            self._hover_offset = value
+            self._mark_dirty(DIRTY_POSITION)
+
+    def _draw_position(self):
+        offset2d = math_util.rotate_vec2d(self.rotation2d, (0, self.hover_offset))
+        return math_util.vec_2d_plus(self.position2d, offset2d)
+
     def flip(self):
         """Flip the card face up/down"""
         self.is_face_up = not self.is_face_up
         self.image_src = self.face_up_image if self.is_face_up else self.face_down_image
-        self._store_cache()
 
     def set_face_up(self):
         """Set the card to face up"""
         if not self.is_face_up:
             self.is_face_up = True
             self.image_src = self.face_up_image
-            self._store_cache()
 
     def set_face_down(self):
         """Set the card to face down"""
         if self.is_face_up:
             self.is_face_up = False
             self.image_src = self.face_down_image
-            self._store_cache()
 
     def update(self):
         """Update card state"""
@@ -488,22 +685,21 @@ class Card(RenderableImage):
 
     def update_position(self, new_pos, animation_layer=0):
         """Update both the display position and collision rect"""
-        old_pos = self.position2d
         # self.position2d = new_pos
         hover_adjusted_pos = (new_pos[0], new_pos[1] + self.hover_offset)
         self.rect.x = hover_adjusted_pos[0] - CARD_WIDTH / 3
         self.rect.y = hover_adjusted_pos[1] - CARD_HEIGHT / 2.8
         # Animation Magic Touch Here
         if animation_layer in (0,1,2):
-            animation.play_animation(self,move_to("position2d",old_pos, new_pos, 0.2),animation_layer)
+            self._tween_to("position2d", new_pos, animation_layer, move_to)
 
     def update_rotation(self, new_rot, animation_layer=1):
         old_rot = self.rotation2d
         # self.rotation2d = new_rot
         if animation_layer in [0, 1, 2]:
             if abs( math_util.vec_2d_dot(math_util.vec_2d_plus(old_rot,new_rot),(1,1)) ) > 0.001:
-                animation.play_animation(self, ease_in_out_2d("rotation2d", old_rot, new_rot, 0.2),layer=animation_layer)
-            else:
+                self._tween_to("rotation2d", new_rot, animation_layer, ease_in_out_2d)
+            elif not self._is_tweened_to("rotation2d", new_rot, 1):
                 middle_rot = (old_rot[1] , -old_rot[0])
 
                 scale_animation_sequence = AnimationSequenceTask(loop=False)
@@ -514,8 +710,37 @@ class Card(RenderableImage):
                 scale_animation_sequence.add_sub_task(animation_task_1)
                 scale_animation_sequence.add_sub_task(animation_task_2)
 
+                self._tweens["rotation2d"] = (scale_animation_sequence, new_rot)
                 animation.play_animation(self, scale_animation_sequence, layer=1)
 
+    def _is_tweened_to(self, property_name, target, animation_layer):
+        # the property is already at the target, or the tween started last is still on its way there
+        running = animation.get_animation(self, animation_layer)
+        (task, task_target) = self._tweens.get(property_name, (None, None))
+        if running is None:
+            return getattr(self, property_name) == target
+        return running is task and task_target == target
+
+    def _tween_to(self, property_name, target, animation_layer, create_task):
+        """
+        Tween the property from its current value to target, unless it is already there or on its way. The task of
+        the last tween is pointed at the new target when it is still running in the layer or has finished, instead
+        of making a new one
+        :param create_task: factory of the tween, e.g. move_to
+        """
+        if self._is_tweened_to(property_name, target, animation_layer):
+            return
+        start = getattr(self, property_name)
+        (task, task_target) = self._tweens.get(property_name, (None, None))
+        if type(task) is AnimationTask and (task.finished or animation.get_animation(self, animation_layer) is task):
+            task.retarget(start, target)
+        else:
+            task = create_task(property_name, start, target, 0.2)
+            # the card keeps its tweens to retarget them
+            task.pooled = False
+        self._tweens[property_name] = (task, target)
+        animation.play_animation(self, task, animation_layer)
+
     def contains_point(self, pos):
         """Check if a point is within the card's clickable area"""
         # Using expanded hitbox for better detection, especially for stacked cards
@@ -525,44 +750,25 @@ class Card(RenderableImage):
 
     def draw(self, screen):
         """Draw the card with highlighting if selected"""
-        offset2d = math_util.rotate_vec2d(self.rotation2d, (0, self.hover_offset))
-        hover_adjusted_pos = math_util.vec_2d_plus(self.position2d, offset2d)
-
         if self.highlighted or self.selected:
+            hover_adjusted_pos = self._draw_position()
             angle = math_util.rotation_to_euler_angle(self.rotation2d)
+            color = (147, 112, 219) if self.highlighted else (255, 140, 0)
 
             if abs(angle) == 90:  # For left/right players
-                # Smaller highlight for side players
-                highlight = pygame.Surface((CARD_WIDTH + 2, CARD_HEIGHT + 2))
-                highlight.set_alpha(150)
-
-                if self.highlighted:
-                    highlight.fill((147, 112, 219))
-                else:
-                    highlight.fill((255, 140, 0))
-
-                # Rotate highlight to match card orientation
-                highlight = pygame.transform.rotate(highlight, angle)
+                # Smaller highlight for side players, rotated to match card orientation
+                highlight = highlight_surface(color, angle)
                 highlight_rect = highlight.get_rect(center=hover_adjusted_pos)
-                screen.blit(highlight, highlight_rect.topleft)
+                submit(screen, highlight, highlight_rect.topleft, self.layer)
             else:  # For bottom player and 2-player game
                 # Original highlight size
-                highlight = pygame.Surface((CARD_WIDTH + 2, CARD_HEIGHT + 2))
-                highlight.set_alpha(150)
-
-                if self.highlighted:
-                    highlight.fill((147, 112, 219))
-                else:
-                    highlight.fill((255, 140, 0))
+                highlight = highlight_surface(color, 0)
 
                 highlight_x = hover_adjusted_pos[0] - (CARD_WIDTH + 4) / 2
                 highlight_y = hover_adjusted_pos[1] - (CARD_HEIGHT + 4) / 2
-                screen.blit(highlight, (highlight_x, highlight_y))
+                submit(screen, highlight, (highlight_x, highlight_y), self.layer)
 
-        original_pos = self.position2d
-        self.position2d = hover_adjusted_pos
         super().draw(screen)
-        self.position2d = original_pos
 
 
 
@@ -966,9 +1172,13 @@ class GameState:
                 self.human_input = human_player_input
                 last_player = core.PlayerAgent(self.game_manager, human_player_input)
             else:
-                last_player = core.PlayerAgent(self.game_manager, core.AIPlayerInput())
+                last_player = core.PlayerAgent(self.game_manager, create_ai_player_input())
             self.game_manager.add_player(last_player)
         self.game_manager.add_game_result_listener(self.check_winner)
+        self.game_manager.add_job_scheduled_listener(lambda job: pygame.event.post(pygame.event.Event(JOB_SCHEDULED_EVENT)))
+        # a job lasts until the animations started by it and by its listeners have played
+        self.game_manager.add_job_evoke_listeners(lambda job: animation.begin_capture(),
+                                                  lambda job: job.await_completion(*animation.end_capture()))
 
     def start_draw_initial_card(self):
         job = None
@@ -1347,23 +1557,51 @@ class GameState:
 class ScreenBase:
     def __init__(self, background_filename=None):
         self.objects = []
+        # objects that rarely change are drawn once on a copy of the background, see _update_static_surface
+        self.static_objects = []
+        self._static_surface = None
+        self._static_bounds = []
 
         if background_filename is not None:
             if os.path.exists(background_filename):
-                self.background_image = pygame.image.load(background_filename)
-                # self.background_image = pygame.transform.smoothscale(self.background_image, (800, 600))
-                self.background_image = pygame.transform.smoothscale(self.background_image, (900, 675))
+                # resampled once per process, or taken as it is from the pre-scaled assets
+                self.background_image = assets.load_scaled(background_filename, (WINDOW_WIDTH, WINDOW_HEIGHT),
+                                                           opaque=True)
             else:
                 print(f"Warning: Background image {background_filename} not found.")
                 self.background_image = None
         else:
             self.background_image = None
 
-    def draw(self, screen):
+    def add_static_object(self, visual_object):
+        """
+        Draw the object as part of the background, it is redrawn only when its transform or image changes
+        """
+        self.static_objects.append(visual_object)
+
+    def _update_static_surface(self, screen):
+        # drawing an object clears its dirty bits, and the static objects are only drawn here
+        if self._static_surface is not None and not any(o.dirty for o in self.static_objects):
+            return
+        if self._static_surface is None:
+            self._static_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT)).convert()
         if self.background_image is not None:
-            screen.blit(self.background_image, (0, 0))
+            self._static_surface.blit(self.background_image, (0, 0))
         else:
-            screen.fill((0, 0, 0))
+            self._static_surface.fill((0, 0, 0))
+        for o in self.static_objects:
+            o.draw(self._static_surface)
+        # the surface is drawn again in place, so the renderer has to repaint where the objects were and are now
+        bounds = [o.bounds() if isinstance(o, RenderableImage) else None for o in self.static_objects]
+        if isinstance(screen, DirtyRectRenderer):
+            for rect in self._static_bounds + bounds:
+                screen.invalidate(rect)
+        self._static_bounds = bounds
+
+    def draw(self, screen):
+        self._update_static_surface(screen)
+        # the regions that changed on the static surface have been invalidated when it was drawn
+        submit(screen, self._static_surface, (0, 0), BACKGROUND_LAYER, owner=self, changed=False)
 
         for o in self.objects:
             o.draw(screen)
@@ -1371,6 +1609,28 @@ class ScreenBase:
     def update(self):
         for o in self.objects:
             o.update()
+        for o in self.static_objects:
+            o.update()
+
+    def is_idle(self):
+        """
+        :return: True when the screen does not change until the next input, so the main loop can wait for it
+        """
+        return True
+
+    def fixed_update(self, dt):
+        """
+        Advance the game logic by one fixed step, called as often as the frame clock needs per frame
+        :param dt: seconds of game time
+        """
+        pass
+
+    def close(self):
+        """
+        Called when another screen replaced this one, looping animations of the objects would run forever otherwise
+        """
+        for o in self.objects + self.static_objects:
+            animation.stop_animation(o)
 
     def keydown(self, event):
         pass
@@ -1508,6 +1768,10 @@ class StartScreen(ScreenBase):
         if current_time - self.start_time >= self.transition_delay:
             self.transition_to_home_screen()
 
+    def is_idle(self):
+        # moves on to the home screen after transition_delay
+        return False
+
     def transition_to_home_screen(self):
         global current_screen
         print("Transitioning to HomeScreen...")
@@ -1608,12 +1872,6 @@ class StartGameScreen(ScreenBase):
             global current_screen
             current_screen = HomeScreen()
 
-    def draw(self, screen):
-        """Draw the screen and all its objects"""
-        super().draw(screen)  # Draw background first
-        for obj in self.objects:
-            obj.draw(screen)
-
 class EndDrawLabel(ClickableLabel):
     def __init__(self, game_state):
         super().__init__(
@@ -1733,8 +1991,8 @@ class TwoPlayerScreen(ScreenBase):
 
         self.player1_profile = RenderableImage("resources/images/ui/labels/you_icon.png",(WINDOW_WIDTH * 0.05, WINDOW_HEIGHT * 0.815),(0.04,0.04),(1,0)) # shanti made the modification to fix the position
         self.player2_profile = RenderableImage("resources/images/ui/labels/computer.png",(WINDOW_WIDTH * 0.05, WINDOW_HEIGHT * 0.145),(0.04,0.04),(1,0)) # shanti made the modification to fix the position
-        self.objects.append(self.player1_profile)
-        self.objects.append(self.player2_profile)
+        self.add_static_object(self.player1_profile)
+        self.add_static_object(self.player2_profile)
 
         # Add buttons to objects list
         self.objects.extend(self.buttons.values())
@@ -1874,16 +2132,13 @@ class TwoPlayerScreen(ScreenBase):
         # Draw game state
         self.game_state.draw(screen)
 
-        # Draw UI elements
-        for button in self.buttons.values():
-            button.draw(screen)
+        # the buttons are in self.objects and drawn by ScreenBase, their layer keeps them above the cards
 
         # Draw turn indicator
         # tiwie's edit
         # font = pygame.font.Font(None, 36)
         # text = font.render(f"Player {self.game_state.current_player + 1}'s Turn", True, (255, 255, 255))
         # screen.blit(text, (10, 10))
-        font = pygame.font.Font(None, 36)
 
         # Define player names based on their index
         player_names = ["YOUR", "COMPUTER'S"] # Shanti change to capital letter so it's consistent
@@ -1892,7 +2147,7 @@ class TwoPlayerScreen(ScreenBase):
         current_player_name = player_names[self.game_state.current_player]
 
         # Create the text to display
-        text = font.render(f"{current_player_name} TURN", True, (255, 255, 255))
+        text = render_text(f"{current_player_name} TURN", 36)
         screen.blit(text, (WINDOW_WIDTH/6.5, WINDOW_HEIGHT/2.25))
 
         # tiwie delete this because we have end draw button
@@ -1915,9 +2170,15 @@ class TwoPlayerScreen(ScreenBase):
         if hasattr(self, 'draw_player_labels'):
             self.draw_player_labels(screen)
 
+    def is_idle(self):
+        # the game only moves on by itself while jobs are running, e.g. during the turns of the AI players
+        return not self.game_state.game_manager.has_pending_jobs()
+
+    def fixed_update(self, dt):
+        self.game_state.game_logic_server.update(dt)  # update the game logic server
+
     def update(self):
         """Update game state"""
-        self.game_state.game_logic_server.update()  # update the game logic server
         for button in self.buttons.values():
             button.update()
 
@@ -2047,9 +2308,9 @@ class ThreePlayerScreen(ScreenBase):
         self.player1_profile = RenderableImage("resources/images/ui/labels/you_icon.png",(WINDOW_WIDTH * 0.06, WINDOW_HEIGHT * 0.82),(0.04,0.04),(1,0)) # shanti made the modification to fix the position
         self.player2_profile = RenderableImage("resources/images/ui/labels/computer_1.png",(WINDOW_WIDTH * 0.22, WINDOW_HEIGHT * 0.07),(0.04,0.04),(1,0))  # shanti made the modification to fix the position
         self.player3_profile = RenderableImage("resources/images/ui/labels/computer_2.png",(WINDOW_WIDTH * 0.78, WINDOW_HEIGHT * 0.07),(0.055,0.055),(1,0)) # shanti made the modification to fix the position
-        self.objects.append(self.player1_profile)
-        self.objects.append(self.player2_profile)
-        self.objects.append(self.player3_profile)
+        self.add_static_object(self.player1_profile)
+        self.add_static_object(self.player2_profile)
+        self.add_static_object(self.player3_profile)
 
         # Add buttons to objects list
         self.objects.extend(self.buttons.values())
@@ -2199,16 +2460,13 @@ class ThreePlayerScreen(ScreenBase):
         # Draw game state
         self.game_state.draw(screen)
 
-        # Draw UI elements
-        for button in self.buttons.values():
-            button.draw(screen)
+        # the buttons are in self.objects and drawn by ScreenBase, their layer keeps them above the cards
 
         # Draw turn indicator
         # tiwi start code
         # font = pygame.font.Font(None, 36)
         # text = font.render(f"Player {self.game_state.current_player + 1}'s Turn", True, (255, 255, 255))
         # screen.blit(text, (10, 10))
-        font = pygame.font.Font(None, 36)
 
         # Define player names based on their index
         player_names = ["YOUR", "COMPUTER 1'S", "COMPUTER 2'S"] # Shanti change to capital letter so it's consistent
@@ -2217,7 +2475,7 @@ class ThreePlayerScreen(ScreenBase):
         current_player_name = player_names[self.game_state.current_player]
 
         # Create the text to display
-        text = font.render(f"{current_player_name} TURN", True, (255, 255, 255))
+        text = render_text(f"{current_player_name} TURN", 36)
         screen.blit(text, (WINDOW_WIDTH/2.5, 50))
         # tiwi end code
         # tiwie delete this because we have end draw button
@@ -2260,9 +2518,15 @@ class ThreePlayerScreen(ScreenBase):
 
     # tiwie code end
 
+    def is_idle(self):
+        # the game only moves on by itself while jobs are running, e.g. during the turns of the AI players
+        return not self.game_state.game_manager.has_pending_jobs()
+
+    def fixed_update(self, dt):
+        self.game_state.game_logic_server.update(dt)  # update the game logic server
+
     def update(self):
         """Update game state"""
-        self.game_state.game_logic_server.update()  # Add this line
         for button in self.buttons.values():
             button.update()
 
@@ -2324,27 +2588,69 @@ from time import sleep
 pygame.init()
 screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
 pygame.display.set_caption('Card Game Funt4stic Te4m')
+if os.path.exists(CARD_ATLAS_PATH):
+    assets.load_atlas(CARD_ATLAS_PATH)
+if os.path.exists(PRESCALED_MANIFEST_PATH):
+    assets.load_prescaled(PRESCALED_MANIFEST_PATH)
 current_screen = StartScreen()
 
 
+def handle_time_scale_key(event):
+    """
+    :return: True when the key changed the speed of the game
+    """
+    if event.key in TIME_SCALE_KEYS:
+        time_scale.set_scale(TIME_SCALE_KEYS[event.key])
+    elif event.key == PAUSE_KEY:
+        time_scale.toggle_pause()
+    elif event.key == SKIP_AI_ANIMATIONS_KEY:
+        time_scale.skip_ai_animations = not time_scale.skip_ai_animations
+    else:
+        return False
+    print(f"time scale {time_scale.scale}, skip AI animations {time_scale.skip_ai_animations}")
+    return True
+
+
 def main():
     global current_screen
     game_over = False
+    # only the regions that changed since the last frame are repainted and sent to the display
+    renderer = DirtyRectRenderer(screen)
+    last_screen = current_screen
 
     while not game_over:
-        for event in pygame.event.get():
+        # the only place the loop waits for the display rate
+        frame_clock.tick()
+        if current_screen is not last_screen:
+            last_screen.close()
+            last_screen = current_screen
+        events = pygame.event.get()
+        # nothing moves while the game is paused
+        if len(events) == 0 and (time_scale.paused or current_screen.is_idle() and not animation.is_active()):
+            # nothing changes until something happens, so neither update nor draw while waiting
+            event = pygame.event.wait(IDLE_WAIT_TIMEOUT)
+            frame_clock.reset()
+            if event.type == NOEVENT:
+                continue
+            events = [event] + pygame.event.get()
+
+        for event in events:
             if event.type == QUIT:
                 game_over = True
             if event.type == MOUSEBUTTONUP:
                 current_screen.mouseup(event)
-            if event.type == KEYDOWN:
+            if event.type == KEYDOWN and not handle_time_scale_key(event):
                 current_screen.keydown(event)
+            if event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                renderer.invalidate()
 
+        for dt in frame_clock.logic_steps():
+            current_screen.fixed_update(dt)
         current_screen.update()
-        animation.update()
-        current_screen.draw(screen)
-        pygame.display.flip()
-        pygame.time.delay(30)
+        animation.update(frame_clock.dt)
+        renderer.begin_frame()
+        current_screen.draw(renderer)
+        pygame.display.update(renderer.end_frame())
 
     pygame.quit()
 
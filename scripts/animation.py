@@ -1,12 +1,90 @@
 import math
+import weakref
+from bisect import bisect_right
 
-import pygame.time
+from scripts.time_scale import time_scale
+
+try:
+    import numpy
+except ImportError:
+    # the animations are evaluated one by one without numpy
+    numpy = None
+
+# tasks of a layer with the same type of curve run together in numpy arrays when there are at least this many of them,
+# below that the numpy calls cost more than they save
+BATCH_THRESHOLD = 16
+# samples of a baked curve shape over its domain, and how far a baked shape may be off the analytic one
+BAKED_TABLE_SIZE = 256
+BAKE_TOLERANCE = 1e-3
+
+# how the value of a task is combined with the lower layers in the same frame, see AnimationTask.blend
+BLEND_OVERRIDE = 'override'
+BLEND_ADDITIVE = 'additive'
+
+# the longest step an animation is advanced by, an instant time scale ends every tween within it
+MAX_ANIMATION_STEP = 3600.0
+
+# recycled tasks and curves kept per type, see release_task
+MAX_POOL_SIZE = 256
+_pools = {}
+
+
+class BakedShape:
+    """
+    A normalized curve shape sampled once into a table and evaluated by linear interpolation.
+    Outside of its domain the analytic shape is used
+    """
+    def __init__(self, function, domain=(0.0, 1.0), size=BAKED_TABLE_SIZE):
+        """
+        :param function: the analytic shape, x -> value
+        :param domain: (low, high) range of x that is sampled
+        :param size: number of intervals of the table
+        """
+        self.function = function
+        (self.low, self.high) = domain
+        self.size = size
+        self._scale = size / (self.high - self.low)
+        self.table = [function(self.low + i / self._scale) for i in range(size + 1)]
+
+    def __call__(self, x):
+        if not self.low <= x <= self.high:
+            return self.function(x)
+        position = (x - self.low) * self._scale
+        index = int(position)
+        if index >= self.size:
+            return self.table[-1]
+        value = self.table[index]
+        return value + (self.table[index + 1] - value) * (position - index)
+
+    def max_error(self, samples_per_interval=4):
+        """
+        :return: the largest difference to the analytic shape, checked between the samples of the table
+        """
+        count = self.size * samples_per_interval
+        return max(abs(self(x) - self.function(x))
+                   for x in (self.low + (self.high - self.low) * i / count for i in range(count + 1)))
+
+
+# shape function -> BakedShape, shared by every curve that uses the shape
+_baked_shapes = {}
+
+
+def baked_shape(function, domain=(0.0, 1.0), size=BAKED_TABLE_SIZE):
+    key = (function, domain, size)
+    if key not in _baked_shapes:
+        _baked_shapes[key] = BakedShape(function, domain, size)
+    return _baked_shapes[key]
 
 
 class AnimationCurve:
     '''
     Input a time(t) to it and get the value
     '''
+    # names of the attributes taken by the static evaluate_batch(np, *arrays) of the curve, which is given the numpy
+    # module, one array per name and then the array of times and returns the array of values. None when the curve
+    # can not be evaluated in a batch
+    batch_fields = None
+
     def __init__(self):
         pass
 
@@ -37,14 +115,49 @@ class AnimationTask:
         self.loop = loop
         self.playtime = 0
         self.propertyDict = {}
+        self.on_complete_listener_list = []
+        # BLEND_OVERRIDE replaces what the lower layers set, BLEND_ADDITIVE adds to it, or to the value the property
+        # had when the task started if no lower layer sets it
+        self.blend = BLEND_OVERRIDE
+        self.additive_bases = {}
+        # a task made by the factory functions is given back to the pools once Animation is done with it,
+        # set it to False to keep using the task after that
+        self.pooled = False
+        # handles of the plays of the task that are not done yet, see Animation.play_animation
+        self.handles = []
 
     @property
     def finished(self):
         return self.playtime >= self.duration
 
+    def add_on_complete_listener(self, on_complete_listener):
+        """
+        :param on_complete_listener: called without arguments when the task has finished and is retired by Animation,
+        not when it is stopped or replaced
+        """
+        self.on_complete_listener_list.append(on_complete_listener)
+
+    def complete(self):
+        for listener in self.on_complete_listener_list:
+            listener()
+
     def reset(self):
         self.playtime = 0
 
+    def retarget(self, start, end):
+        """
+        Start the task over from start to end, for the tasks whose curves have a start and an end, e.g. move_to or
+        ease_in_out_2d. Play the task again for the change to be picked up
+        :param start: a number, or a 2d tuple for an Animation2DCurve
+        """
+        for curve in self.propertyDict.values():
+            if isinstance(curve, Animation2DCurve):
+                (curve.curve_x.start, curve.curve_x.end) = (start[0], end[0])
+                (curve.curve_y.start, curve.curve_y.end) = (start[1], end[1])
+            else:
+                (curve.start, curve.end) = (start, end)
+        self.reset()
+
     def bind_property(self, propertyName, curve):
         '''
         :param propertyName: The property you want the animation curve to control
@@ -66,8 +179,7 @@ class AnimationTask:
             if not self.loop:
                 self.playtime = self.duration
             else:  # loop
-                while self.playtime >= self.duration:
-                    self.playtime -= self.duration
+                self.playtime = math.fmod(self.playtime, self.duration) if self.duration > 0 else 0
 
         self.evaluate(gameObject, self.playtime)
 
@@ -78,62 +190,331 @@ class AnimationSequenceTask(AnimationTask):
         self.duration = 0
         self._sub_task_list = []
         self._sub_task_start_time_list = []
+        # index of the sub task evaluated last, the next one is usually the same or the one after it
+        self._cursor = 0
 
     def add_sub_task(self, sub_animation_task):
         self._sub_task_list.append(sub_animation_task)
         self._sub_task_start_time_list.append(self.duration)
-        self.duration = sum([sub_task.duration for sub_task in self._sub_task_list])
+        self.duration += sub_animation_task.duration
+
+    def _sub_task_index(self, t):
+        """
+        :return: index of the sub task playing at 0 < t <= duration, the last one that has started before t
+        """
+        start_times = self._sub_task_start_time_list
+        last = len(start_times) - 1
+        for i in (self._cursor, self._cursor + 1):
+            if i <= last and start_times[i] <= t and (i == last or t < start_times[i + 1]):
+                self._cursor = i
+                return i
+        self._cursor = min(bisect_right(start_times, t) - 1, last)
+        return self._cursor
 
     def evaluate(self, gameObject, t):
         if gameObject is None:
             print(f"Warning: Animation task {self.__repr__()} has not bound any game object, ignored.")
             return
-        for i in range(len(self._sub_task_list)):
-            if t <= 0:
-                self._sub_task_list[0].evaluate(gameObject, 0)
-            elif t > self.duration:
-                self._sub_task_list[-1].evaluate(gameObject, t - self._sub_task_start_time_list[-1])
-            elif i < len(self._sub_task_list) - 1 and self._sub_task_start_time_list[i + 1] <= t:
-                continue
+        if len(self._sub_task_list) == 0:
+            return
+        if t <= 0:
+            self._sub_task_list[0].evaluate(gameObject, 0)
+        elif t > self.duration:
+            self._sub_task_list[-1].evaluate(gameObject, t - self._sub_task_start_time_list[-1])
+        else:
+            i = self._sub_task_index(t)
+            self._sub_task_list[i].evaluate(gameObject, t - self._sub_task_start_time_list[i])
+
+
+class _TweenBatch:
+    """
+    The running tasks of one layer that each drive a single property with curves of the same type, as a struct of
+    arrays: the fields of the curves, the durations and the loop flags are numpy arrays, so that the play times of all
+    the tasks are advanced and all the curves are evaluated by a few numpy calls per frame
+    """
+    def __init__(self, curve_type, dimension, entries):
+        """
+        :param dimension: 1 for a curve, 2 for an Animation2DCurve of two curves of curve_type
+        :param entries: list of (game object, animation task, property name, curve)
+        """
+        self.curve_type = curve_type
+        self.dimension = dimension
+        self.gameObjectRefs = [weakref.ref(entry[0]) for entry in entries]
+        self.tasks = [entry[1] for entry in entries]
+        self.propertyNames = [entry[2] for entry in entries]
+        if dimension == 2:
+            curves = [component for entry in entries for component in (entry[3].curve_x, entry[3].curve_y)]
+        else:
+            curves = [entry[3] for entry in entries]
+        self.fields = [numpy.array([getattr(curve, field) for curve in curves], dtype=float)
+                       for field in curve_type.batch_fields]
+        self.durations = numpy.array([task.duration for task in self.tasks], dtype=float)
+        self.loops = numpy.array([task.loop for task in self.tasks], dtype=bool)
+
+    def update(self, dt, pending_writes):
+        """
+        The same as AnimationTask.update of every task
+        :param pending_writes: the writes of the frame, see Animation.update
+        :return: list of (game object, animation task) that have finished
+        """
+        # the play times stay in the tasks, which may be reset from outside
+        playtimes = numpy.fromiter((task.playtime for task in self.tasks), float, len(self.tasks)) + dt
+        ended = playtimes >= self.durations
+        # a loop without duration stays at 0, like in AnimationTask.update
+        positive = self.durations > 0
+        wrapped = numpy.where(positive, numpy.fmod(playtimes, numpy.where(positive, self.durations, 1.0)), 0.0)
+        playtimes = numpy.where(ended, numpy.where(self.loops, wrapped, self.durations), playtimes)
+        for (task, playtime) in zip(self.tasks, playtimes.tolist()):
+            task.playtime = playtime
+        times = numpy.repeat(playtimes, 2) if self.dimension == 2 else playtimes
+        values = self.curve_type.evaluate_batch(numpy, *self.fields, times).tolist()
+        if self.dimension == 2:
+            components = iter(values)
+            values = zip(components, components)
+        for (gameObjectRef, propertyName, value) in zip(self.gameObjectRefs, self.propertyNames, values):
+            gameObject = gameObjectRef()
+            if gameObject is not None:
+                pending_writes.setdefault(gameObject, {})[propertyName] = value
+        return [(self.gameObjectRefs[index](), self.tasks[index])
+                for index in numpy.flatnonzero(ended & ~self.loops).tolist()]
+
+
+class AnimationHandle:
+    """
+    What Animation.play_animation returns, done once the task has finished, or has been replaced or stopped, so that
+    the game logic can wait for what it shows. A looping task never finishes, so its handle is done at once
+    """
+    def __init__(self):
+        self.done = False
+        self.done_listener_list = []
+
+    def add_done_listener(self, done_listener):
+        if self.done:
+            done_listener()
+        else:
+            self.done_listener_list.append(done_listener)
+
+    def settle(self):
+        if self.done:
+            return
+        self.done = True
+        for listener in self.done_listener_list:
+            listener()
+
+
+def _settle_handles(animation_task):
+    (handles, animation_task.handles) = (animation_task.handles, [])
+    for handle in handles:
+        handle.settle()
+
+
+class _CompositeTarget:
+    """
+    Stands in for a game object while its task is evaluated, the properties set on it are written to the pending
+    writes of the frame, combined with what the lower layers have set according to the blend of the task
+    """
+    __slots__ = ('gameObjectRef', 'animationTask', 'pending_writes')
+
+    def __init__(self, gameObject, animationTask, pending_writes):
+        object.__setattr__(self, 'gameObjectRef', weakref.ref(gameObject))
+        object.__setattr__(self, 'animationTask', animationTask)
+        object.__setattr__(self, 'pending_writes', pending_writes)
+
+    def __setattr__(self, propertyName, value):
+        gameObject = self.gameObjectRef()
+        if gameObject is None:
+            return
+        writes = self.pending_writes.setdefault(gameObject, {})
+        if self.animationTask.blend == BLEND_ADDITIVE:
+            if propertyName in writes:
+                lower = writes[propertyName]
             else:
-                sub_task = self._sub_task_list[i]
-                sub_time = t - self._sub_task_start_time_list[i]
-                sub_task.evaluate(gameObject, sub_time)
-                break
+                lower = self.animationTask.additive_bases.setdefault(propertyName, getattr(gameObject, propertyName))
+            value = tuple(a + b for (a, b) in zip(lower, value)) if isinstance(value, tuple) else lower + value
+        writes[propertyName] = value
 
 
 class Animation:
     """
-    The animation system that actually runs the animation tasks
+    The animation system that actually runs the animation tasks.
+    Each layer only holds the running tasks, a task is removed as soon as it has finished, and the game objects are
+    weakly referenced, so that the objects of a discarded screen are not kept alive by their animations.
+    The values of all layers are composited first and every animated property is set once at the end of the frame
     """
     def __init__(self):
         print("Animation initialized")
-        self.gameObjectAnimationTaskDict_base = {}
-        self.gameObjectAnimationTaskDict_layer_1 = {}
-        self.gameObjectAnimationTaskDict_Layer_2 = {}
-        self.clock = pygame.time.Clock()
+        self.gameObjectAnimationTaskDict_base = weakref.WeakKeyDictionary()
+        self.gameObjectAnimationTaskDict_layer_1 = weakref.WeakKeyDictionary()
+        self.gameObjectAnimationTaskDict_Layer_2 = weakref.WeakKeyDictionary()
+        # per layer: (tween batches, (composite target, animation task) updated one by one, number of tasks),
+        # None when it has to be sorted out again because a task was started, stopped or has finished
+        self._layer_plans = [None, None, None]
+        # game object -> {property name: value} set by the layers in this frame, written once every layer is done
+        self._pending_writes = {}
+        # lists of the handles played since begin_capture
+        self._captures = []
+
+    def _layer_dicts(self):
+        return [self.gameObjectAnimationTaskDict_base, self.gameObjectAnimationTaskDict_layer_1, self.gameObjectAnimationTaskDict_Layer_2]
 
     def register_animation_task(self, gameObject, animation_task, layer=0):
-        if layer == 0:
-            self.gameObjectAnimationTaskDict_base[gameObject] = animation_task
-        elif layer == 1:
-            self.gameObjectAnimationTaskDict_layer_1[gameObject] = animation_task
-        elif layer == 2:
-            self.gameObjectAnimationTaskDict_Layer_2[gameObject] = animation_task
-
-    def play_animation(self, gameObject, animation_task, layer=0):
+        if gameObject is None:
+            print(f"Warning: Animation task {animation_task.__repr__()} has not bound any game object, ignored.")
+            return
+        if layer in (0, 1, 2):
+            self._layer_plans[layer] = None
+        animation_task.additive_bases = {}
+        if layer in (0, 1, 2):
+            gameObjectAnimationTaskDict = self._layer_dicts()[layer]
+            replaced_task = gameObjectAnimationTaskDict.get(gameObject)
+            gameObjectAnimationTaskDict[gameObject] = animation_task
+            if replaced_task is not None and replaced_task is not animation_task:
+                _settle_handles(replaced_task)
+                release_task(replaced_task)
+
+    def play_animation(self, gameObject, animation_task, layer=0, on_complete=None):
+        """
+        :param on_complete: optional listener called without arguments when the task has finished, see
+        AnimationTask.add_on_complete_listener
+        :return: AnimationHandle of this play of the task
+        """
+        if on_complete is not None:
+            animation_task.add_on_complete_listener(on_complete)
+        handle = AnimationHandle()
+        if animation_task.loop or gameObject is None:
+            handle.settle()
+        else:
+            animation_task.handles.append(handle)
         self.register_animation_task(gameObject,animation_task, layer)
-
-    def update(self):
-        dt = self.clock.tick(60)/1000
-        for gameObjectAnimationTaskDict in [self.gameObjectAnimationTaskDict_base, self.gameObjectAnimationTaskDict_layer_1, self.gameObjectAnimationTaskDict_Layer_2]:
-            for (gameObject, animationTask) in gameObjectAnimationTaskDict.items():
-                if animationTask is not None:
-                    if animationTask.finished:
-                        gameObjectAnimationTaskDict[gameObject] = None
-                        continue
-                    else:
-                        animationTask.update(gameObject, dt)
+        for handles in self._captures:
+            handles.append(handle)
+        return handle
+
+    def begin_capture(self):
+        """
+        Collect the handles of the animations played from now until end_capture, captures can be nested
+        """
+        self._captures.append([])
+
+    def end_capture(self):
+        """
+        :return: list of the handles played since the matching begin_capture
+        """
+        return self._captures.pop()
+
+    def get_animation(self, gameObject, layer=0):
+        """
+        :return: the task running on the game object in the layer, None if there is none
+        """
+        if layer not in (0, 1, 2):
+            return None
+        return self._layer_dicts()[layer].get(gameObject)
+
+    def stop_animation(self, gameObject):
+        """
+        Stop the animation tasks of the game object in every layer, the properties keep their current values
+        """
+        for gameObjectAnimationTaskDict in self._layer_dicts():
+            animationTask = gameObjectAnimationTaskDict.pop(gameObject, None)
+            if animationTask is not None:
+                _settle_handles(animationTask)
+                release_task(animationTask)
+        self._layer_plans = [None, None, None]
+
+    def is_active(self):
+        """
+        :return: True when any animation task is still running
+        """
+        return any(len(gameObjectAnimationTaskDict) > 0 for gameObjectAnimationTaskDict in self._layer_dicts())
+
+    def active_count(self):
+        return sum(len(gameObjectAnimationTaskDict) for gameObjectAnimationTaskDict in self._layer_dicts())
+
+    def update(self, dt):
+        """
+        :param dt: seconds of real time since the last update, see FrameClock, each layer runs at its speed of
+        time_scale
+        """
+        completed = []
+        # the layers run one after another, so a higher layer has the last word on a property or adds to it
+        for (layer, gameObjectAnimationTaskDict) in enumerate(self._layer_dicts()):
+            plan = self._layer_plans[layer]
+            # a game object that has been collected takes its task out of the layer
+            if plan is None or plan[2] != len(gameObjectAnimationTaskDict):
+                plan = self._layer_plans[layer] = self._plan_layer(gameObjectAnimationTaskDict, completed)
+            (tween_batches, single_tasks, task_count) = plan
+            layer_dt = min(time_scale.scale_dt(dt, layer), MAX_ANIMATION_STEP)
+            finished = []
+            for tween_batch in tween_batches:
+                finished += tween_batch.update(layer_dt, self._pending_writes)
+            for (target, animationTask) in single_tasks:
+                gameObject = target.gameObjectRef()
+                if gameObject is None:
+                    continue
+                animationTask.update(target, layer_dt)
+                if animationTask.finished:
+                    finished.append((gameObject, animationTask))
+            for (gameObject, animationTask) in finished:
+                self._retire(gameObjectAnimationTaskDict, gameObject, animationTask, completed)
+            if len(finished) > 0:
+                self._layer_plans[layer] = None
+        self._apply_pending_writes()
+        # the listeners may start new animations, so they are called once every layer is done
+        for animationTask in completed:
+            animationTask.complete()
+            _settle_handles(animationTask)
+        for animationTask in completed:
+            # unless a listener has started it over
+            if animationTask.finished:
+                release_task(animationTask)
+
+    def _apply_pending_writes(self):
+        # every property of an object is set once per frame, whatever number of layers animate it
+        for (gameObject, writes) in self._pending_writes.items():
+            for (propertyName, value) in writes.items():
+                setattr(gameObject, propertyName, value)
+        self._pending_writes.clear()
+
+    @staticmethod
+    def _retire(gameObjectAnimationTaskDict, gameObject, animationTask, completed):
+        if gameObject is not None and gameObjectAnimationTaskDict.get(gameObject) is animationTask:
+            del gameObjectAnimationTaskDict[gameObject]
+        completed.append(animationTask)
+
+    def _plan_layer(self, gameObjectAnimationTaskDict, completed):
+        """
+        Sort the running tasks of a layer into tween batches of the same curve type and the tasks that are updated one
+        by one: sequences, tasks of several properties, curves without batch_fields, types with too few tasks and
+        every task when numpy is missing
+        :return: (list of _TweenBatch, list of (composite target, animation task), number of tasks)
+        """
+        groups = {}
+        single_tasks = []
+        for (gameObject, animationTask) in list(gameObjectAnimationTaskDict.items()):
+            if animationTask.finished:
+                self._retire(gameObjectAnimationTaskDict, gameObject, animationTask, completed)
+                continue
+            key = None
+            if numpy is not None and type(animationTask) is AnimationTask and len(animationTask.propertyDict) == 1 \
+                    and animationTask.blend == BLEND_OVERRIDE:
+                (propertyName, curve) = next(iter(animationTask.propertyDict.items()))
+                if isinstance(curve, Animation2DCurve):
+                    if type(curve.curve_x) is type(curve.curve_y):
+                        key = (type(curve.curve_x), 2)
+                else:
+                    key = (type(curve), 1)
+            if key is not None and key[0].batch_fields is not None:
+                groups.setdefault(key, []).append((gameObject, animationTask, propertyName, curve))
+            else:
+                single_tasks.append((_CompositeTarget(gameObject, animationTask, self._pending_writes), animationTask))
+        tween_batches = []
+        for ((curve_type, dimension), entries) in groups.items():
+            if len(entries) >= BATCH_THRESHOLD:
+                tween_batches.append(_TweenBatch(curve_type, dimension, entries))
+            else:
+                single_tasks += [(_CompositeTarget(entry[0], entry[1], self._pending_writes), entry[1])
+                                 for entry in entries]
+        return tween_batches, single_tasks, len(gameObjectAnimationTaskDict)
 
 
 class ConstantCurve(AnimationCurve):
@@ -148,7 +529,36 @@ class ConstantCurve(AnimationCurve):
         return self.constant_value
 
 
+def _half_cosine_shape(x):
+    return (1 - math.cos(math.pi * x)) * 0.5
+
+
+def _full_cosine_shape(x):
+    return (1 - math.cos(2*math.pi * x)) * 0.5
+
+
+def _vibrate_shape(x):
+    u = x - 0.5
+    return math.sin(3 * math.pi * u) + math.sin(math.pi * u)
+
+
+def _hop_with_overshoot_shape(x):
+    base = math.sin(math.pi * 2 * x * x)
+    attenuation = math.cos(0.5 * math.pi * x)
+    return base * attenuation * 1.37288
+
+
+def _ease_in_out_shape(x):
+    _2pi = math.pi * 2
+    u = _2pi * x
+    return (u - math.sin(u))/_2pi
+
+
 class OvershootCurve(AnimationCurve):
+    # the normalized shapes, replaced by their BakedShape in baked mode, see set_baked_curves
+    base_shape = staticmethod(_half_cosine_shape)
+    overshoot_shape = staticmethod(_full_cosine_shape)
+
     def __init__(self, start, end, duration, overshoot = 1):
         super().__init__()
         self.start = start
@@ -158,12 +568,23 @@ class OvershootCurve(AnimationCurve):
 
     def evaluate(self, t):
         x = t / self.duration
-        overshoot = self.overshoot * (1 - math.cos(2*math.pi * x)) * 0.5
-        base =  (1 - math.cos(math.pi * x)) * 0.5
+        overshoot = self.overshoot * self.overshoot_shape(x)
+        base = self.base_shape(x)
         return (base + overshoot) * (self.end - self.start) + self.start
 
+    batch_fields = ('start', 'end', 'duration', 'overshoot')
+
+    @staticmethod
+    def evaluate_batch(np, start, end, duration, overshoot, t):
+        x = t / duration
+        overshoot = overshoot * (1 - np.cos(2*math.pi * x)) * 0.5
+        base = (1 - np.cos(math.pi * x)) * 0.5
+        return (base + overshoot) * (end - start) + start
+
 
 class VibrateCurve(AnimationCurve):
+    shape = staticmethod(_vibrate_shape)
+
     def __init__(self, start, duration, amplitude = 1):
         self.start = start
         self.duration = duration
@@ -171,12 +592,22 @@ class VibrateCurve(AnimationCurve):
 
     def evaluate(self, t):
         x = t / self.duration
-        u = x - 0.5
-        fx = math.sin(3 * math.pi * u) + math.sin(math.pi * u)
+        fx = self.shape(x)
         return fx * self.amplitude + self.start
 
+    batch_fields = ('start', 'duration', 'amplitude')
+
+    @staticmethod
+    def evaluate_batch(np, start, duration, amplitude, t):
+        x = t / duration
+        u = x - 0.5
+        fx = np.sin(3 * math.pi * u) + np.sin(math.pi * u)
+        return fx * amplitude + start
+
 
 class HopWithOvershootCurve(AnimationCurve):
+    shape = staticmethod(_hop_with_overshoot_shape)
+
     def __init__(self, start, offset, duration):
         super().__init__()
         self.start = start
@@ -185,11 +616,19 @@ class HopWithOvershootCurve(AnimationCurve):
 
     def evaluate(self, t):
         x = t / self.duration
-        base = math.sin(math.pi * 2 * x * x)
-        attenuation = math.cos(0.5 * math.pi * x)
-        fx = base * attenuation * 1.37288
+        fx = self.shape(x)
         return self.start + fx * self.offset
 
+    batch_fields = ('start', 'offset', 'duration')
+
+    @staticmethod
+    def evaluate_batch(np, start, offset, duration, t):
+        x = t / duration
+        base = np.sin(math.pi * 2 * x * x)
+        attenuation = np.cos(0.5 * math.pi * x)
+        fx = base * attenuation * 1.37288
+        return start + fx * offset
+
 
 class SineCurve(AnimationCurve):
     """
@@ -205,11 +644,21 @@ class SineCurve(AnimationCurve):
     def evaluate(self, t):
         return self.a * math.sin(self.omiga * t + self.phi) + self.c
 
+    batch_fields = ('a', 'omiga', 'phi', 'c')
+
+    @staticmethod
+    def evaluate_batch(np, a, omiga, phi, c, t):
+        return a * np.sin(omiga * t + phi) + c
+
 
 class PingPongCurve(AnimationCurve):
     """
     constantly and smoothly move between start and end
     """
+    # a ping and a pong
+    shape = staticmethod(_half_cosine_shape)
+    shape_domain = (0.0, 2.0)
+
     def __init__(self, start, end, duration):
         super().__init__()
         self.start = start
@@ -219,7 +668,15 @@ class PingPongCurve(AnimationCurve):
     def evaluate(self, t):
         length = self.end - self.start
         x = t / self.duration
-        return 0.5 * (1 - math.cos(math.pi * x)) * length + self.start
+        return self.shape(x) * length + self.start
+
+    batch_fields = ('start', 'end', 'duration')
+
+    @staticmethod
+    def evaluate_batch(np, start, end, duration, t):
+        length = end - start
+        x = t / duration
+        return 0.5 * (1 - np.cos(math.pi * x)) * length + start
 
 
 class MoveToCurve(AnimationCurve):
@@ -236,6 +693,13 @@ class MoveToCurve(AnimationCurve):
         rate = t/self.duration
         return (1 - rate) * self.start + rate * self.end
 
+    batch_fields = ('start', 'end', 'duration')
+
+    @staticmethod
+    def evaluate_batch(np, start, end, duration, t):
+        rate = t/duration
+        return (1 - rate) * start + rate * end
+
 
 class SmoothDampCurve(AnimationCurve):
     def __init__(self, start, end, duration):
@@ -274,6 +738,8 @@ class EaseInOutCurve(AnimationCurve):
     """
     move smoothly from start to the end in given duration
     """
+    shape = staticmethod(_ease_in_out_shape)
+
     def __init__(self, start, end, duration):
         super().__init__()
         self.start = start
@@ -282,9 +748,16 @@ class EaseInOutCurve(AnimationCurve):
 
     def evaluate(self, t):
         rate = t/self.duration
+        return self.shape(rate) * (self.end - self.start) + self.start
+
+    batch_fields = ('start', 'end', 'duration')
+
+    @staticmethod
+    def evaluate_batch(np, start, end, duration, t):
+        rate = t/duration
         _2pi = math.pi * 2
         u = _2pi * rate
-        return (u - math.sin(u))/_2pi * (self.end - self.start) + self.start
+        return (u - np.sin(u))/_2pi * (end - start) + start
 
 
 class HopCurve(AnimationCurve):
@@ -301,6 +774,86 @@ class HopCurve(AnimationCurve):
         x = t/self.duration
         return (1-(2 * x - 1)**2) * self.height + self.pos
 
+    batch_fields = ('pos', 'height', 'duration')
+
+    @staticmethod
+    def evaluate_batch(np, pos, height, duration, t):
+        x = t/duration
+        return (1-(2 * x - 1)**2) * height + pos
+
+
+# (curve type, attribute of the shape, domain of the shape)
+_BAKEABLE_SHAPES = [(OvershootCurve, 'base_shape', (0.0, 1.0)), (OvershootCurve, 'overshoot_shape', (0.0, 1.0)),
+                    (VibrateCurve, 'shape', (0.0, 1.0)), (HopWithOvershootCurve, 'shape', (0.0, 1.0)),
+                    (PingPongCurve, 'shape', PingPongCurve.shape_domain), (EaseInOutCurve, 'shape', (0.0, 1.0))]
+_analytic_shapes = {(curve_type, name): getattr(curve_type, name) for (curve_type, name, domain) in _BAKEABLE_SHAPES}
+
+
+def set_baked_curves(enabled=True, size=BAKED_TABLE_SIZE, tolerance=BAKE_TOLERANCE):
+    """
+    Switch the analytic curves with trigonometric shapes between evaluating the shape and interpolating a baked table
+    of it. The curves evaluated in numpy batches stay analytic
+    :param size: number of intervals of the tables
+    :param tolerance: largest allowed difference of a baked shape to the analytic one, in units of the normalized shape
+    """
+    shapes = []
+    for (curve_type, name, domain) in _BAKEABLE_SHAPES:
+        function = _analytic_shapes[curve_type, name]
+        if not enabled:
+            shapes.append((curve_type, name, staticmethod(function)))
+            continue
+        shape = baked_shape(function, domain, size)
+        error = shape.max_error()
+        if error > tolerance:
+            raise ValueError(f"Baked shape {function.__name__} of {size} samples is off by {error}, more than {tolerance}")
+        shapes.append((curve_type, name, shape))
+    # nothing changes when a shape fails the check
+    for (curve_type, name, shape) in shapes:
+        setattr(curve_type, name, shape)
+
+
+def _pooled(object_type, *args, **kwargs):
+    pool = _pools.get(object_type)
+    if not pool:
+        return object_type(*args, **kwargs)
+    instance = pool.pop()
+    instance.__init__(*args, **kwargs)
+    return instance
+
+
+def _pooled_task(task_type, *args, **kwargs):
+    animation_task = _pooled(task_type, *args, **kwargs)
+    animation_task.pooled = True
+    return animation_task
+
+
+def _release(instance):
+    if isinstance(instance, Animation2DCurve):
+        _release(instance.curve_x)
+        _release(instance.curve_y)
+    pool = _pools.setdefault(type(instance), [])
+    if len(pool) < MAX_POOL_SIZE:
+        pool.append(instance)
+
+
+def release_task(animation_task):
+    """
+    Give a task made by the factory functions back to the pools with its curves and sub tasks, Animation does it when
+    the task has finished, is replaced in its layer or is stopped. Nothing happens to any other task
+    """
+    if not animation_task.pooled:
+        return
+    animation_task.pooled = False
+    for curve in animation_task.propertyDict.values():
+        _release(curve)
+    animation_task.propertyDict.clear()
+    animation_task.on_complete_listener_list.clear()
+    if isinstance(animation_task, AnimationSequenceTask):
+        for sub_task in animation_task._sub_task_list:
+            release_task(sub_task)
+        animation_task._sub_task_list.clear()
+    _release(animation_task)
+
 
 def sine_scale_2d(property_name):
     """
@@ -308,102 +861,102 @@ def sine_scale_2d(property_name):
     :param property_name: property name to control
     :return: animation task
     """
-    animation_task = AnimationTask(math.pi * 2, loop=True)
-    sine2dAnimationCurve = Animation2DCurve(SineCurve(c=3), SineCurve(c=3))
+    animation_task = _pooled_task(AnimationTask, math.pi * 2, loop=True)
+    sine2dAnimationCurve = _pooled(Animation2DCurve, _pooled(SineCurve, c=3), _pooled(SineCurve, c=3))
     animation_task.bind_property(property_name, sine2dAnimationCurve)
     return animation_task
 
 
 def ease_in_out_2d(property_name, start_pos, end_pos, duration=1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve_x = EaseInOutCurve(start_pos[0], end_pos[0], duration)
-    curve_y = EaseInOutCurve(start_pos[1], end_pos[1], duration)
-    _2d_curve = Animation2DCurve(curve_x, curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve_x = _pooled(EaseInOutCurve, start_pos[0], end_pos[0], duration)
+    curve_y = _pooled(EaseInOutCurve, start_pos[1], end_pos[1], duration)
+    _2d_curve = _pooled(Animation2DCurve, curve_x, curve_y)
     animation_task.bind_property(property_name, _2d_curve)
     return animation_task
 
 
 def ease_in_out_1d(property_name, start_pos, end_pos, duration=1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve = EaseInOutCurve(start_pos, end_pos, duration)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve = _pooled(EaseInOutCurve, start_pos, end_pos, duration)
     animation_task.bind_property(property_name, curve)
     return animation_task
 
 def ping_pong(property_name, start_pos, end_pos, duration):
-    animation_task = AnimationTask(duration=duration, loop=True)
-    curve_x = PingPongCurve(start_pos[0], end_pos[0], duration * 0.5)
-    curve_y = PingPongCurve(start_pos[1], end_pos[1], duration * 0.5)
-    _2d_curve = Animation2DCurve(curve_x, curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=True)
+    curve_x = _pooled(PingPongCurve, start_pos[0], end_pos[0], duration * 0.5)
+    curve_y = _pooled(PingPongCurve, start_pos[1], end_pos[1], duration * 0.5)
+    _2d_curve = _pooled(Animation2DCurve, curve_x, curve_y)
     animation_task.bind_property(property_name, _2d_curve)
     return animation_task
 
 def overshoot_2d(property_name, start_pos, end_pos, duration, overshoot = 1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve_x = OvershootCurve(start_pos[0], end_pos[0], duration, overshoot = overshoot)
-    curve_y = OvershootCurve(start_pos[1], end_pos[1], duration, overshoot = overshoot)
-    _2d_curve = Animation2DCurve(curve_x, curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve_x = _pooled(OvershootCurve, start_pos[0], end_pos[0], duration, overshoot = overshoot)
+    curve_y = _pooled(OvershootCurve, start_pos[1], end_pos[1], duration, overshoot = overshoot)
+    _2d_curve = _pooled(Animation2DCurve, curve_x, curve_y)
     animation_task.bind_property(property_name, _2d_curve)
     return animation_task
 
 def hop_with_overshoot_2d(property_name, start_pos, offset, duration):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve_x = HopWithOvershootCurve(start_pos[0], offset[0], duration)
-    curve_y = HopWithOvershootCurve(start_pos[1], offset[1], duration)
-    _2d_curve = Animation2DCurve(curve_x, curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve_x = _pooled(HopWithOvershootCurve, start_pos[0], offset[0], duration)
+    curve_y = _pooled(HopWithOvershootCurve, start_pos[1], offset[1], duration)
+    _2d_curve = _pooled(Animation2DCurve, curve_x, curve_y)
     animation_task.bind_property(property_name, _2d_curve)
     return animation_task
 
 def hop_2d(property_name, start_pos, offset, duration=1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve_x = HopCurve(start_pos[0], offset[0], duration)
-    curve_y = HopCurve(start_pos[1], offset[1], duration)
-    _2d_curve = Animation2DCurve(curve_x, curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve_x = _pooled(HopCurve, start_pos[0], offset[0], duration)
+    curve_y = _pooled(HopCurve, start_pos[1], offset[1], duration)
+    _2d_curve = _pooled(Animation2DCurve, curve_x, curve_y)
     animation_task.bind_property(property_name, _2d_curve)
     return animation_task
 
 def vibrate_once_2d(property_name, start_pos, amplitude, duration):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve_x = VibrateCurve(start_pos[0], duration, amplitude[0])
-    curve_y = VibrateCurve(start_pos[1], duration, amplitude[1])
-    _2d_curve = Animation2DCurve(curve_x, curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve_x = _pooled(VibrateCurve, start_pos[0], duration, amplitude[0])
+    curve_y = _pooled(VibrateCurve, start_pos[1], duration, amplitude[1])
+    _2d_curve = _pooled(Animation2DCurve, curve_x, curve_y)
     animation_task.bind_property(property_name, _2d_curve)
     return animation_task
 
 def vibrate_once_1d(property_name, start_pos, amplitude, duration):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve = VibrateCurve(start_pos, duration, amplitude)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve = _pooled(VibrateCurve, start_pos, duration, amplitude)
     animation_task.bind_property(property_name, curve)
     return animation_task
 
 def constant_2d(property_name, constant2d, duration=1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve_x = ConstantCurve(constant2d[0])
-    curve_y = ConstantCurve(constant2d[1])
-    _2d_curve = Animation2DCurve(curve_x, curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve_x = _pooled(ConstantCurve, constant2d[0])
+    curve_y = _pooled(ConstantCurve, constant2d[1])
+    _2d_curve = _pooled(Animation2DCurve, curve_x, curve_y)
     animation_task.bind_property(property_name, _2d_curve)
     return animation_task
 
 def constant_1d(property_name, constant, duration=1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    curve = ConstantCurve(constant)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    curve = _pooled(ConstantCurve, constant)
     animation_task.bind_property(property_name, curve)
     return animation_task
 
 
 def move_to(property_name, start_pos, end_pos, duration = 1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    move_to_curve_x = MoveToCurve(start_pos[0], end_pos[0], duration)
-    move_to_curve_y = MoveToCurve(start_pos[1], end_pos[1], duration)
-    move_to_2d_curve = Animation2DCurve(move_to_curve_x, move_to_curve_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    move_to_curve_x = _pooled(MoveToCurve, start_pos[0], end_pos[0], duration)
+    move_to_curve_y = _pooled(MoveToCurve, start_pos[1], end_pos[1], duration)
+    move_to_2d_curve = _pooled(Animation2DCurve, move_to_curve_x, move_to_curve_y)
     animation_task.bind_property(property_name, move_to_2d_curve)
     return animation_task
 
 
 def smooth_damp_2d(property_name, start_pos, end_pos, duration = 1):
-    animation_task = AnimationTask(duration=duration, loop=False)
-    smooth_damp_x = SmoothDampCurve(start_pos[0], end_pos[0], duration)
-    smooth_damp_y = SmoothDampCurve(start_pos[1], end_pos[1], duration)
-    smooth_damp_2d_curve = Animation2DCurve(smooth_damp_x, smooth_damp_y)
+    animation_task = _pooled_task(AnimationTask, duration=duration, loop=False)
+    smooth_damp_x = _pooled(SmoothDampCurve, start_pos[0], end_pos[0], duration)
+    smooth_damp_y = _pooled(SmoothDampCurve, start_pos[1], end_pos[1], duration)
+    smooth_damp_2d_curve = _pooled(Animation2DCurve, smooth_damp_x, smooth_damp_y)
     animation_task.bind_property(property_name, smooth_damp_2d_curve)
     return animation_task
 
@@ -413,7 +966,7 @@ def hop_sequence(property_name, start_pos, offset, pre_time=1, post_time=1, hop_
     animation_task_2 = hop_2d(property_name, start_pos, offset, hop_time)
     animation_task_3 = constant_2d(property_name, start_pos, post_time)
 
-    sequence_task = AnimationSequenceTask(loop=loop)
+    sequence_task = _pooled_task(AnimationSequenceTask, loop=loop)
     sequence_task.add_sub_task(animation_task_1)
     sequence_task.add_sub_task(animation_task_2)
     sequence_task.add_sub_task(animation_task_3)
@@ -427,7 +980,7 @@ def sway_sequence(property_name, start_pos, end_pos, pre_time=1, post_time=1, ho
     animation_task_2 = ping_pong(property_name, start_pos,  end_pos, hop_time)
     animation_task_3 = constant_2d(property_name, start_pos, post_time)
 
-    sequence_task = AnimationSequenceTask(loop=loop)
+    sequence_task = _pooled_task(AnimationSequenceTask, loop=loop)
     sequence_task.add_sub_task(animation_task_1)
     sequence_task.add_sub_task(animation_task_2)
     sequence_task.add_sub_task(animation_task_3)
@@ -440,7 +993,7 @@ def hop_with_overshoot_sequence(property_name, start_pos, offset, pre_time=1, po
     animation_task_2 = hop_with_overshoot_2d(property_name, start_pos, offset, hop_time)
     animation_task_3 = constant_2d(property_name, start_pos, post_time)
 
-    sequence_task = AnimationSequenceTask(loop=loop)
+    sequence_task = _pooled_task(AnimationSequenceTask, loop=loop)
     sequence_task.add_sub_task(animation_task_1)
     sequence_task.add_sub_task(animation_task_2)
     sequence_task.add_sub_task(animation_task_3)
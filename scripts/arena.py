@@ -0,0 +1,287 @@
+import contextlib
+import functools
+import importlib
+import json
+import math
+import os
+import random
+import sys
+from multiprocessing import Pool
+
+import scripts.main as core
+
+# Plays PlayerInput implementations against each other on the rules engine, without the UI.
+# Every pairing plays pairs of games on the same seed with the seats swapped, so neither the deal nor the seat
+# favours one side. After each round of games a sequential probability ratio test decides whether a pairing has
+# seen enough, and the Bradley-Terry ratings of all entrants are refitted from every result so far.
+# The state is written to a checkpoint after each round so that an interrupted run can be resumed.
+
+# a job is finished within a single update when dt is this large
+JOB_STEP = 5.0
+DEFAULT_MAX_TURNS = 300
+# a turn takes about 10 jobs, more than this means the players are stuck
+MAX_STEPS_PER_TURN = 100
+ELO_SCALE = 400 / math.log(10)
+
+H0 = 'H0'
+H1 = 'H1'
+MAX_GAMES = 'max_games'
+
+
+def load_player_input(spec):
+    """
+    :param spec: "module:name" of a PlayerInput class or any other callable without arguments returning one, or
+    "module:name:argument" to call it with the string argument, e.g. the file of scripts.tablebase:TablebasePlayerInput
+    :return: callable without arguments returning the PlayerInput
+    """
+    module_name, _, name = spec.partition(':')
+    name, separator, argument = name.partition(':')
+    if not name:
+        raise ValueError(f"Player input spec {spec} should look like module:name or module:name:argument")
+    factory = getattr(importlib.import_module(module_name), name)
+    if separator:
+        return functools.partial(factory, argument)
+    return factory
+
+
+class _TurnCounter(core.IPlayerAgentListener):
+    def __init__(self):
+        self.turns = 0
+
+    def start_turn(self, job):
+        self.turns += 1
+
+
+def play_game(specs, seed, max_turns=DEFAULT_MAX_TURNS):
+    """
+    Play one game, the players take their turns in the order of specs
+    :param specs: player input specs, see load_player_input
+    :return: index of the winner in specs, None when nobody won within max_turns
+    """
+    random.seed(seed)
+    game = core.Game()
+    game_manager = game.game_manager
+    players = []
+    for spec in specs:
+        player = core.PlayerAgent(game_manager, load_player_input(spec)())
+        game_manager.add_player(player)
+        players.append(player)
+    winners = []
+    game_manager.add_game_result_listener(winners.append)
+    turn_counter = _TurnCounter()
+    game_manager.add_player_action_listener(turn_counter)
+
+    job = None
+    for player in players:
+        job = player.draw_start_cards()
+    job.add_end_evoke_listener(game_manager.start_next_player_turn)
+    for step in range((max_turns + 1) * MAX_STEPS_PER_TURN):
+        if len(winners) > 0 or turn_counter.turns > max_turns:
+            break
+        game_manager.update(JOB_STEP)
+    if len(winners) == 0:
+        return None
+    return players.index(winners[0])
+
+
+def _play_game_pair(task):
+    # both seatings on the same seed, the result is counted from the side of spec_a
+    (pairing_index, spec_a, spec_b, seed, max_turns) = task
+    wins = draws = losses = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for (specs, index_a) in (((spec_a, spec_b), 0), ((spec_b, spec_a), 1)):
+            winner = play_game(specs, seed, max_turns)
+            if winner is None:
+                draws += 1
+            elif winner == index_a:
+                wins += 1
+            else:
+                losses += 1
+    return pairing_index, wins, draws, losses
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """
+    Log likelihood ratio of elo1 against elo0 for the results, with the normal approximation of the game scores
+    :return: 0 while the results can not tell anything yet
+    """
+    count = wins + draws + losses
+    if count == 0:
+        return 0.0
+    score = (wins + draws / 2) / count
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / count
+    if variance <= 0:
+        return 0.0
+    score0 = expected_score(elo0)
+    score1 = expected_score(elo1)
+    return count * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def bradley_terry_ratings(entrants, pairings, iterations=200):
+    """
+    Fit Bradley-Terry strengths to the results of all pairings, a draw counts as half a win for both sides
+    :return: dict of entrant -> rating on the Elo scale, the mean rating is 0
+    """
+    wins = {entrant: 0.0 for entrant in entrants}
+    games = {}
+    for pairing in pairings:
+        (a, b) = (pairing['a'], pairing['b'])
+        wins[a] += pairing['wins'] + pairing['draws'] / 2
+        wins[b] += pairing['losses'] + pairing['draws'] / 2
+        count = pairing['wins'] + pairing['draws'] + pairing['losses']
+        games[(a, b)] = games.get((a, b), 0) + count
+        games[(b, a)] = games.get((b, a), 0) + count
+    strengths = {entrant: 1.0 for entrant in entrants}
+    for i in range(iterations):
+        updated = {}
+        for entrant in entrants:
+            denominator = sum(count / (strengths[a] + strengths[b])
+                              for ((a, b), count) in games.items() if a == entrant)
+            # half a virtual win keeps an entrant without wins away from a strength of 0
+            updated[entrant] = (wins[entrant] + 0.5) / (denominator + 1 / strengths[entrant]) \
+                if denominator > 0 else strengths[entrant]
+        strengths = updated
+    ratings = {entrant: ELO_SCALE * math.log(strength) for (entrant, strength) in strengths.items()}
+    mean = sum(ratings.values()) / len(ratings)
+    return {entrant: rating - mean for (entrant, rating) in ratings.items()}
+
+
+class Arena:
+    """
+    Round robin of player inputs with SPRT early stopping and a resumable checkpoint
+    """
+    def __init__(self, entrants, elo0=0.0, elo1=20.0, alpha=0.05, beta=0.05, max_games=2000, batch=8,
+                 max_turns=DEFAULT_MAX_TURNS, seed=0, checkpoint=None):
+        """
+        :param entrants: player input specs, see load_player_input
+        :param batch: number of game pairs each open pairing plays per round
+        :param checkpoint: path of the json file to save the progress to and resume from
+        """
+        if len(entrants) < 2:
+            raise ValueError("The arena needs at least 2 entrants")
+        self.entrants = list(entrants)
+        self.settings = {'elo0': elo0, 'elo1': elo1, 'alpha': alpha, 'beta': beta, 'max_games': max_games,
+                         'max_turns': max_turns, 'seed': seed}
+        self.batch = batch
+        self.checkpoint = checkpoint
+        self.pairings = [{'a': a, 'b': b, 'wins': 0, 'draws': 0, 'losses': 0, 'next_seed': 0, 'result': None}
+                         for (i, a) in enumerate(self.entrants) for b in self.entrants[i + 1:]]
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._load(checkpoint)
+
+    def _load(self, path):
+        with open(path) as f:
+            state = json.load(f)
+        if state['entrants'] != self.entrants or state['settings'] != self.settings:
+            raise ValueError(f"Checkpoint {path} belongs to a different arena")
+        self.pairings = state['pairings']
+        print(f"resume from {path}")
+
+    def _save(self):
+        if self.checkpoint is None:
+            return
+        state = {'entrants': self.entrants, 'settings': self.settings, 'pairings': self.pairings,
+                 'ratings': self.ratings()}
+        # write a new file and swap it in, so that an interrupted write keeps the old checkpoint
+        temporary_path = self.checkpoint + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(temporary_path, self.checkpoint)
+
+    def open_pairings(self):
+        return [pairing for pairing in self.pairings if pairing['result'] is None]
+
+    def ratings(self):
+        return bradley_terry_ratings(self.entrants, self.pairings)
+
+    def llr(self, pairing):
+        return sprt_llr(pairing['wins'], pairing['draws'], pairing['losses'],
+                        self.settings['elo0'], self.settings['elo1'])
+
+    def _decide(self, pairing):
+        (lower, upper) = sprt_bounds(self.settings['alpha'], self.settings['beta'])
+        llr = self.llr(pairing)
+        if llr >= upper:
+            pairing['result'] = H1
+        elif llr <= lower:
+            pairing['result'] = H0
+        elif pairing['wins'] + pairing['draws'] + pairing['losses'] >= self.settings['max_games']:
+            pairing['result'] = MAX_GAMES
+
+    def _round_tasks(self):
+        tasks = []
+        for (index, pairing) in enumerate(self.pairings):
+            if pairing['result'] is not None:
+                continue
+            for i in range(self.batch):
+                # every pairing plays the same sequence of seeds
+                seed = self.settings['seed'] + pairing['next_seed'] + i
+                tasks.append((index, pairing['a'], pairing['b'], seed, self.settings['max_turns']))
+            pairing['next_seed'] += self.batch
+        return tasks
+
+    def run(self, processes=None):
+        """
+        Play rounds until every pairing is decided
+        :param processes: number of worker processes, all cores by default, 1 plays in this process
+        :return: dict of entrant -> rating
+        """
+        processes = processes or os.cpu_count() or 1
+        pool = Pool(processes) if processes > 1 else None
+        try:
+            while len(self.open_pairings()) > 0:
+                tasks = self._round_tasks()
+                results = pool.imap_unordered(_play_game_pair, tasks) if pool is not None \
+                    else map(_play_game_pair, tasks)
+                for (index, wins, draws, losses) in results:
+                    pairing = self.pairings[index]
+                    pairing['wins'] += wins
+                    pairing['draws'] += draws
+                    pairing['losses'] += losses
+                for pairing in self.pairings:
+                    if pairing['result'] is None:
+                        self._decide(pairing)
+                self._save()
+                self.print_status()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return self.ratings()
+
+    def print_status(self):
+        for pairing in self.pairings:
+            print(f"{pairing['a']} vs {pairing['b']}: +{pairing['wins']} ={pairing['draws']} -{pairing['losses']}"
+                  f" llr {self.llr(pairing):.2f} {pairing['result'] or ''}")
+        for (entrant, rating) in sorted(self.ratings().items(), key=lambda item: -item[1]):
+            print(f"{rating:8.1f} {entrant}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rate Notty player inputs against each other")
+    parser.add_argument("entrants", nargs='+', help="player inputs as module:name or module:name:argument, e.g. scripts.main:AIPlayerInput")
+    parser.add_argument("--elo0", type=float, default=0.0, help="elo difference of the null hypothesis")
+    parser.add_argument("--elo1", type=float, default=20.0, help="elo difference of the alternative hypothesis")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--max-games", type=int, default=2000, help="games per pairing before giving up")
+    parser.add_argument("--batch", type=int, default=8, help="game pairs per pairing and round")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS, help="turns before a game is a draw")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--checkpoint", default=None, help="json file to save the progress to and resume from")
+    args = parser.parse_args()
+    arena = Arena(args.entrants, args.elo0, args.elo1, args.alpha, args.beta, args.max_games, args.batch,
+                  args.max_turns, args.seed, args.checkpoint)
+    arena.run(args.processes)
+    sys.exit(0)
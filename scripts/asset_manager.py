@@ -0,0 +1,217 @@
+import json
+import os
+from collections import OrderedDict
+
+import pygame
+
+
+class AssetManager:
+    """
+    Decodes every image file once and shares the surface with every object that shows it.
+    The shared surfaces must not be drawn on, transform them into a new surface instead.
+    """
+    def __init__(self):
+        self._surfaces = {}
+        # image path -> (atlas image path, rect)
+        self._atlas_sprites = {}
+        # image path -> size of the full image, and the pre-scaled levels sorted from small to large
+        self._image_sizes = {}
+        self._levels = {}
+        self.load_count = 0
+        self.request_count = 0
+
+    def load_atlas(self, manifest_path):
+        """
+        Serve the images packed by scripts.atlas from the atlas, the atlas is decoded on the first request
+        :param manifest_path: path of the manifest written by scripts.atlas
+        """
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        atlas_path = os.path.join(os.path.dirname(manifest_path), manifest['image'])
+        for (path, rect) in manifest['sprites'].items():
+            self._atlas_sprites[os.path.normpath(path)] = (atlas_path, tuple(rect))
+
+    def load_prescaled(self, manifest_path):
+        """
+        Use the levels written by scripts.asset_pipeline when an image is shown smaller than its full size
+        :param manifest_path: path of the manifest written by scripts.asset_pipeline
+        """
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        out_dir = os.path.dirname(manifest_path)
+        for (path, entry) in manifest['images'].items():
+            path = os.path.normpath(path)
+            self._image_sizes[path] = tuple(entry['size'])
+            self._levels[path] = sorted((width * height, width, height, os.path.join(out_dir, level_path))
+                                        for (level_path, width, height) in entry['levels'])
+
+    def image_size(self, path):
+        """
+        :return: size of the full image, without decoding it when the manifest knows it
+        """
+        size2d = self._image_sizes.get(os.path.normpath(path))
+        if size2d is None:
+            size2d = self.load(path).get_size()
+        return size2d
+
+    def load_for_size(self, path, size2d):
+        """
+        :return: the smallest pre-scaled level that is not smaller than size2d, the full image when there is none
+        """
+        for (area, width, height, level_path) in self._levels.get(os.path.normpath(path), ()):
+            if width >= size2d[0] and height >= size2d[1]:
+                return self.load(level_path)
+        return self.load(path)
+
+    def load_exact(self, path, size2d):
+        """
+        :return: the pre-scaled level of exactly size2d, None when there is none
+        """
+        for (area, width, height, level_path) in self._levels.get(os.path.normpath(path), ()):
+            if (width, height) == tuple(size2d):
+                return self.load(level_path)
+        return None
+
+    def load_scaled(self, path, size2d, opaque=False):
+        """
+        :param opaque: convert the surface to the display format without alpha, which is much faster to blit
+        :return: the shared surface of the image at exactly size2d, resampled only the first time
+        """
+        size2d = (int(size2d[0]), int(size2d[1]))
+        key = (path, size2d, opaque)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = self.load_for_size(path, size2d)
+            if surface.get_size() != size2d:
+                surface = pygame.transform.smoothscale(surface, size2d)
+            if opaque:
+                surface = surface.convert()
+            self._surfaces[key] = surface
+        else:
+            self.request_count += 1
+        return surface
+
+    def load(self, path):
+        """
+        :param path: path of the image file
+        :return: the shared surface with per pixel alpha
+        """
+        self.request_count += 1
+        surface = self._surfaces.get(path)
+        if surface is None:
+            sprite = self._atlas_sprites.get(os.path.normpath(path))
+            if sprite is not None:
+                # a view into the atlas, nothing is copied
+                (atlas_path, rect) = sprite
+                surface = self._decode(atlas_path).subsurface(rect)
+            else:
+                surface = self._decode(path)
+            self._surfaces[path] = surface
+        return surface
+
+    def _decode(self, path):
+        surface = self._surfaces.get(path)
+        if surface is None:
+            surface = pygame.image.load(path).convert_alpha()
+            self._surfaces[path] = surface
+            self.load_count += 1
+        return surface
+
+    @property
+    def hit_count(self):
+        return self.request_count - self.load_count
+
+    @property
+    def hit_ratio(self):
+        if self.request_count == 0:
+            return 0.0
+        return self.hit_count / self.request_count
+
+    @property
+    def bytes_held(self):
+        # the sprites of an atlas share the pixels of the atlas
+        return sum(surface.get_pitch() * surface.get_height() for surface in self._surfaces.values()
+                   if surface.get_parent() is None)
+
+    def stats(self):
+        return {'surfaces': len(self._surfaces), 'loads': self.load_count, 'hits': self.hit_count,
+                'hit_ratio': self.hit_ratio, 'bytes': self.bytes_held}
+
+    def clear(self):
+        self._surfaces.clear()
+
+
+class TransformCache:
+    """
+    Least recently used cache of transformed surfaces shared by every object.
+    The key is the source plus the quantized size, angle and alpha, so that objects showing the same image in the same
+    way share one surface. The surfaces are evicted when the cache holds more than max_bytes.
+    """
+    # degrees, the difference can not be seen on a card
+    ANGLE_STEP = 0.5
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._surfaces = OrderedDict()
+        self._bytes_held = 0
+        self.hit_count = 0
+        self.miss_count = 0
+        self.eviction_count = 0
+
+    def make_key(self, image_src, size2d, angle, alpha, angle_step=None):
+        """
+        :param angle_step: degrees between two cached frames, ANGLE_STEP by default
+        :return: (image_src, (width, height), angle, alpha) with every value quantized
+        """
+        angle_step = angle_step or self.ANGLE_STEP
+        angle = round(angle / angle_step) * angle_step % 360
+        return image_src, (round(size2d[0]), round(size2d[1])), angle, int(round(alpha))
+
+    def get(self, key, create):
+        """
+        :param key: made by make_key
+        :param create: function returning the transformed surface, called on a miss
+        :return: the shared transformed surface, it must not be drawn on
+        """
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hit_count += 1
+            return surface
+        self.miss_count += 1
+        surface = create()
+        self._surfaces[key] = surface
+        self._bytes_held += self._surface_bytes(surface)
+        # always keep the newest surface even if it is larger than the whole budget
+        while self._bytes_held > self.max_bytes and len(self._surfaces) > 1:
+            (evicted_key, evicted) = self._surfaces.popitem(last=False)
+            self._bytes_held -= self._surface_bytes(evicted)
+            self.eviction_count += 1
+        return surface
+
+    @staticmethod
+    def _surface_bytes(surface):
+        return surface.get_pitch() * surface.get_height()
+
+    @property
+    def hit_ratio(self):
+        total = self.hit_count + self.miss_count
+        if total == 0:
+            return 0.0
+        return self.hit_count / total
+
+    @property
+    def bytes_held(self):
+        return self._bytes_held
+
+    def stats(self):
+        return {'surfaces': len(self._surfaces), 'hits': self.hit_count, 'misses': self.miss_count,
+                'evictions': self.eviction_count, 'hit_ratio': self.hit_ratio, 'bytes': self._bytes_held}
+
+    def clear(self):
+        self._surfaces.clear()
+        self._bytes_held = 0
+
+
+assets = AssetManager()
+transform_cache = TransformCache()
@@ -0,0 +1,105 @@
+import glob
+import json
+import os
+import sys
+
+import pygame
+
+from scripts.layout import WINDOW_WIDTH, WINDOW_HEIGHT, LABEL_SCALES, label_size
+
+# Pre-scales the UI images so that the game decodes and resamples far fewer pixels, see AssetManager.load_prescaled.
+# Every image gets a chain of mip levels, each half the size of the previous one, the game resamples from the
+# smallest level that is still larger than what it shows, which leaves room for the hover scale-ups.
+# The backgrounds are also written at the exact size of the window, so the screens can blit them as they are, and the
+# labels at the sizes of their scale factors, so a label at rest is drawn without resampling.
+
+DEFAULT_SOURCES = [os.path.join("resources", "images", "ui", "**", "*.png")]
+# glob patterns of the images shown at the size of the window
+BACKGROUND_PATTERNS = [
+    os.path.join("resources", "images", "ui", "screens", "*.png"),
+    os.path.join("resources", "images", "ui", "screens", "StartScreenObject", "Rectangle.png"),
+]
+DEFAULT_OUT = os.path.join("resources", "prescaled", "manifest.json")
+# no level is made smaller than this many pixels on its shorter side
+MIN_LEVEL_SIZE = 16
+
+
+def mip_sizes(size2d, min_level_size=MIN_LEVEL_SIZE):
+    """
+    :return: list of (width, height) of the levels below the full size, from large to small
+    """
+    sizes = []
+    (width, height) = size2d
+    while min(width, height) // 2 >= min_level_size:
+        (width, height) = (width // 2, height // 2)
+        sizes.append((width, height))
+    return sizes
+
+
+def default_exact_sizes():
+    """
+    :return: dict of image path -> list of sizes the game shows the image at, from scripts.layout
+    """
+    exact_sizes = {}
+    for pattern in BACKGROUND_PATTERNS:
+        for path in glob.glob(pattern):
+            exact_sizes.setdefault(os.path.normpath(path), []).append((WINDOW_WIDTH, WINDOW_HEIGHT))
+    for (path, scale_factors) in LABEL_SCALES.items():
+        if not os.path.exists(path):
+            print(f"Warning: label image {path} not found")
+            continue
+        image_size2d = pygame.image.load(path).get_size()
+        for scale_factor in scale_factors:
+            exact_sizes.setdefault(os.path.normpath(path), []).append(label_size(image_size2d, scale_factor))
+    return exact_sizes
+
+
+def _level_name(path, size2d):
+    (root, ext) = os.path.splitext(os.path.normpath(path))
+    return f"{root}@{size2d[0]}x{size2d[1]}.png"
+
+
+def build(image_paths, exact_sizes, manifest_path):
+    """
+    :param image_paths: paths of the images as the game loads them
+    :param exact_sizes: dict of image path -> list of sizes the game shows the image at
+    """
+    out_dir = os.path.dirname(manifest_path) or "."
+    images = {}
+    pixel_count = 0
+    for path in image_paths:
+        image = pygame.image.load(path)
+        levels = []
+        # exact sizes are resampled from the full image, the mip levels from the previous level
+        for size2d in exact_sizes.get(os.path.normpath(path), []):
+            levels.append((size2d, pygame.transform.smoothscale(image, size2d)))
+        level = image
+        for size2d in mip_sizes(image.get_size()):
+            level = pygame.transform.smoothscale(level, size2d)
+            levels.append((size2d, level))
+        entry = {'size': list(image.get_size()), 'levels': []}
+        for (size2d, level_image) in levels:
+            level_path = _level_name(path, size2d)
+            os.makedirs(os.path.join(out_dir, os.path.dirname(level_path)), exist_ok=True)
+            pygame.image.save(level_image, os.path.join(out_dir, level_path))
+            entry['levels'].append([level_path, size2d[0], size2d[1]])
+            pixel_count += size2d[0] * size2d[1]
+        images[os.path.normpath(path)] = entry
+    with open(manifest_path, 'w') as f:
+        json.dump({'images': images}, f, indent=1, sort_keys=True)
+    print(f"{len(images)} images pre-scaled into {pixel_count} pixels")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pre-scale the Notty UI images")
+    parser.add_argument("sources", nargs='*', default=DEFAULT_SOURCES, help="glob patterns of the images")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="path of the manifest")
+    args = parser.parse_args()
+    paths = sorted(set(path for pattern in args.sources for path in glob.glob(pattern, recursive=True)))
+    if len(paths) == 0:
+        print("No image to pre-scale")
+        sys.exit(1)
+    build(paths, default_exact_sizes(), args.out)
+    sys.exit(0)
@@ -0,0 +1,71 @@
+import glob
+import json
+import os
+import sys
+
+import pygame
+
+# Packs many images into one atlas image so that they are decoded at once, see AssetManager.load_atlas.
+# The manifest maps the path of every packed image to its rect in the atlas, the paths are kept as the game uses
+# them so that the runtime can look them up without knowing about the atlas.
+
+DEFAULT_SOURCES = [os.path.join("resources", "images", "cards", "*.png")]
+DEFAULT_OUT = os.path.join("resources", "atlas", "cards.json")
+MAX_ATLAS_WIDTH = 4096
+# transparent pixels between the images so that resampling a sprite never reads its neighbour
+PADDING = 2
+
+
+def pack(sizes, max_width=MAX_ATLAS_WIDTH, padding=PADDING):
+    """
+    Shelf packing, the tallest images go first and fill the rows from left to right
+    :param sizes: dict of key -> (width, height)
+    :return: (dict of key -> (x, y, width, height), (atlas width, atlas height))
+    """
+    rects = {}
+    (x, y, shelf_height, atlas_width) = (0, 0, 0, 0)
+    for key in sorted(sizes.keys(), key=lambda k: (-sizes[k][1], k)):
+        (width, height) = sizes[key]
+        if x > 0 and x + width > max_width:
+            (x, y, shelf_height) = (0, y + shelf_height + padding, 0)
+        rects[key] = (x, y, width, height)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+        atlas_width = max(atlas_width, x - padding)
+    return rects, (atlas_width, y + shelf_height)
+
+
+def build_atlas(image_paths, manifest_path, max_width=MAX_ATLAS_WIDTH):
+    """
+    Write the atlas image next to the manifest, the image has the name of the manifest with .png
+    :param image_paths: paths of the images as the game loads them
+    """
+    images = {os.path.normpath(path): pygame.image.load(path) for path in image_paths}
+    (rects, atlas_size) = pack({path: image.get_size() for (path, image) in images.items()}, max_width)
+    atlas = pygame.Surface(atlas_size, pygame.SRCALPHA)
+    atlas.fill((0, 0, 0, 0))
+    for (path, rect) in rects.items():
+        atlas.blit(images[path], rect[:2])
+    image_name = os.path.splitext(os.path.basename(manifest_path))[0] + ".png"
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    pygame.image.save(atlas, os.path.join(os.path.dirname(manifest_path), image_name))
+    with open(manifest_path, 'w') as f:
+        json.dump({'image': image_name, 'size': list(atlas_size),
+                   'sprites': {path: list(rect) for (path, rect) in sorted(rects.items())}}, f, indent=1)
+    print(f"{len(rects)} images packed into {atlas_size[0]}x{atlas_size[1]}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack the Notty card images into one atlas")
+    parser.add_argument("sources", nargs='*', default=DEFAULT_SOURCES, help="glob patterns of the images to pack")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="path of the manifest")
+    parser.add_argument("--max-width", type=int, default=MAX_ATLAS_WIDTH)
+    args = parser.parse_args()
+    paths = sorted(path for pattern in args.sources for path in glob.glob(pattern))
+    if len(paths) == 0:
+        print("No image to pack")
+        sys.exit(1)
+    build_atlas(paths, args.out, args.max_width)
+    sys.exit(0)
@@ -0,0 +1,28 @@
+import itertools
+
+# Renaming the colours or reflecting the numbers (n -> 11 - n) keeps every valid group valid, so two sets of cards
+# that one of these symmetries maps onto each other play the same. The searches over card indices (see card_to_index)
+# store one representative per class.
+
+# 24 colour permutations times the reflection of numbers
+SYMMETRIES = [(perm, reflect) for perm in itertools.permutations(range(4)) for reflect in (False, True)]
+SYMMETRY_MAPS = [tuple(perm[i // 10] * 10 + (9 - i % 10 if reflect else i % 10) for i in range(40))
+                 for (perm, reflect) in SYMMETRIES]
+
+
+def canonical_position(hand, other_hand):
+    """
+    Map two sets of card indices with the same symmetry to their representative
+    :return: (hand, other_hand) after applying the symmetry that makes the union of both the smallest
+    """
+    best = None
+    for symmetry in SYMMETRY_MAPS:
+        mapped_union = tuple(sorted(symmetry[i] for i in hand + other_hand))
+        if best is None or mapped_union < best[0]:
+            best = (mapped_union, symmetry)
+    symmetry = best[1]
+    return tuple(sorted(symmetry[i] for i in hand)), tuple(sorted(symmetry[i] for i in other_hand))
+
+
+def canonical_union(cards):
+    return min(tuple(sorted(symmetry[i] for i in cards)) for symmetry in SYMMETRY_MAPS)
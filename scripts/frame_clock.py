@@ -0,0 +1,57 @@
+import pygame.time
+
+
+class FrameClock:
+    """
+    The one clock of the main loop.
+    Every frame waits once for the display rate, the game logic then runs in fixed steps for the time that passed,
+    catching up with several steps after a slow frame, while animations and rendering use the time of the frame.
+    The clock runs in real time, the speed of the game is up to scripts.time_scale.
+    """
+    def __init__(self, fps=60, logic_step=1 / 60, max_logic_steps=5):
+        """
+        :param fps: the display rate
+        :param logic_step: seconds of game time per logic step
+        :param max_logic_steps: the most logic steps run in one frame, the time beyond is dropped
+        """
+        self.clock = pygame.time.Clock()
+        self.fps = fps
+        self.logic_step = logic_step
+        self.max_logic_steps = max_logic_steps
+        # seconds of the current frame
+        self.dt = 0.0
+        self._accumulator = 0.0
+
+    def tick(self):
+        """
+        Wait for the next frame
+        :return: the seconds since the last frame
+        """
+        self.dt = self.clock.tick(self.fps) / 1000
+        self._accumulator += self.dt
+        return self.dt
+
+    def logic_steps(self):
+        """
+        :return: generator of the fixed steps to run the logic with in this frame
+        """
+        steps = 0
+        while self._accumulator >= self.logic_step:
+            if steps >= self.max_logic_steps:
+                # too far behind, the logic slows down instead of freezing the frame
+                self._accumulator = 0.0
+                break
+            self._accumulator -= self.logic_step
+            steps += 1
+            yield self.logic_step
+
+    def reset(self):
+        """
+        Forget the time since the last frame, e.g. after the main loop waited for input
+        """
+        self.clock.tick()
+        self.dt = 0.0
+        self._accumulator = 0.0
+
+
+frame_clock = FrameClock()
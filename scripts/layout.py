@@ -0,0 +1,53 @@
+# Sizes shared by the game and the build steps, so that scripts.asset_pipeline pre-scales the images to the sizes the
+# game really shows them at.
+
+WINDOW_WIDTH = 900
+WINDOW_HEIGHT = 675
+
+# label image -> scale factors the screens create the label at, Notty warns about a label missing here
+_LABELS = "resources/images/ui/labels/"
+LABEL_SCALES = {
+    _LABELS + "back_label.png": (0.1,),
+    _LABELS + "clickable_back_label.png": (0.1,),
+    _LABELS + "deck_label.png": (0.16,),
+    _LABELS + "clickable_deck_label.png": (0.16,),
+    _LABELS + "discard_label.png": (0.065,),
+    _LABELS + "clickable_discard_label.png": (0.065,),
+    _LABELS + "draw_from_deck_label.png": (0.15,),
+    _LABELS + "clickable_draw_from_deck_label.png": (0.15,),
+    _LABELS + "draw_from_left_player.png": (0.06,),
+    _LABELS + "clickable_draw_from_left_player.png": (0.06,),
+    _LABELS + "draw_from_player_label.png": (0.15,),
+    _LABELS + "clickable_draw_from_player_label.png": (0.15,),
+    _LABELS + "draw_from_right_player.png": (0.06,),
+    _LABELS + "clickable_draw_from_right_player.png": (0.06,),
+    _LABELS + "end_draw_from_deck.png": (0.05,),
+    _LABELS + "clickable_end_draw_from_deck.png": (0.05,),
+    _LABELS + "end_draw_from_player.png": (0.05,),
+    _LABELS + "clickable_end_draw_from_player.png": (0.05,),
+    _LABELS + "end_turn_label.png": (0.06,),
+    _LABELS + "clickable_end_turn_label.png": (0.06,),
+    _LABELS + "exit_label.png": (0.13, 0.15),
+    _LABELS + "clickable_exit_label.png": (0.13, 0.15),
+    _LABELS + "game_pass_label.png": (0.065,),
+    _LABELS + "clickable_game_pass_label.png": (0.065,),
+    _LABELS + "new_game_label.png": (0.13,),
+    _LABELS + "clickable_new_game_label.png": (0.13,),
+    _LABELS + "play_for_me_label.png": (0.065,),
+    _LABELS + "clickable_play_for_me_label.png": (0.065,),
+    _LABELS + "play_game_label.png": (0.15,),
+    _LABELS + "clickable_play_game_label.png": (0.15,),
+    _LABELS + "quit_game_label.png": (0.12,),
+    _LABELS + "clickable_quit_game_label.png": (0.12,),
+    _LABELS + "rules_label.png": (0.15,),
+    _LABELS + "clickable_rules_label.png": (0.15,),
+    _LABELS + "three_player.png": (0.15,),
+    _LABELS + "clickable_three_player.png": (0.15,),
+    _LABELS + "two_player.png": (0.15,),
+    _LABELS + "clickable_two_player.png": (0.15,),
+}
+
+
+def label_size(image_size2d, scale_factor):
+    # the size a Label draws the image at, rounded like the transform cache rounds it
+    return round(image_size2d[0] * scale_factor), round(image_size2d[1] * scale_factor)
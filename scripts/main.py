@@ -1,8 +1,17 @@
 import re
-import pygame
 import random
 from enum import Enum
 
+from scripts.frame_clock import FrameClock
+from scripts.time_scale import time_scale
+from scripts.turns_to_empty import turns_to_empty, best_group_to_dispose
+
+try:
+    import numpy
+except ImportError:
+    # the card memory scores the steals player by player without numpy
+    numpy = None
+
 # when you want to mute all the print in the module, this is a good way
 # print = lambda x : None
 
@@ -259,99 +268,30 @@ class CollectionOfCards:
             return largest_valid_group
         return None
 
-def probability_of_valid_group(player_list):
-    p0_card_list = player_list[0].collection
-    # now I start to use set
-    candidate_card_set = set()
-
-    # check by color
-    for color in ['red', 'blue', 'green', 'yellow']:
-        same_color_list = [card for card in p0_card_list if card.colour == color]
-        if len(same_color_list) <= 1:
-            continue
-        same_color_list.sort(key=lambda card: card.number)
-        # find valid groups while finding qualified cards, once consecutive count reaches 3 a valid group is found,
-        # and it will return 1 directly
-        consecutive_count = 0
-        for i in range(len(same_color_list)):
-            if i == 0 or same_color_list[i].number == same_color_list[i-1].number + 1:
-                # If the latter card is numerically consecutive with the previous card, add 1 to consecutive count
-                consecutive_count += 1
-            elif same_color_list[i].number == same_color_list[i-1].number:
-                pass
-            elif same_color_list[i].number > same_color_list[i-1].number + 1:
-                # In this branch, a consecutive sublist ends, and we should check the both ends of this list
-                # if the count haven't reached 3
-                # check
-                if consecutive_count >= 3:  # A valid group is already detected, return 1
-                    return 1
-                if consecutive_count == 2:  # Add left end and right end to candidates
-                    left_end_number = same_color_list[i-1].number - 2
-                    if left_end_number >= 0:
-                        candidate_card_set.add((color, left_end_number))
-                    right_end_number = same_color_list[i-1].number + 1
-                    if right_end_number <= 10:
-                        candidate_card_set.add((color, right_end_number))
-                if consecutive_count == 1:
-                    # check whether there is an empty position between two numbers
-                    # to the left and the right of the current number
-                    # there might be duplicated checks for a single number but the python set will handle it
-                    left_end_number = same_color_list[i-1].number - 1
-                    if i >= 2 and same_color_list[i-2].number == same_color_list[i-1].number - 2:
-                        candidate_card_set.add((color, left_end_number))
-                    right_end_number = same_color_list[i-1].number + 1
-                    if i < len(same_color_list) and same_color_list[i].number == same_color_list[i-1].number + 2:
-                        candidate_card_set.add((color, right_end_number))
-                consecutive_count = 1
-        # Final Check after loop
-        # the loop already ends, so I need to do an extra check
-        if consecutive_count >= 3:
-            return 1
-        if consecutive_count == 2:  # Add left end and right end to candidates
-            left_end_number = same_color_list[len(same_color_list) - 1].number - 2
-            if left_end_number >= 0:
-                candidate_card_set.add((color, left_end_number))
-            right_end_number = same_color_list[len(same_color_list) - 1].number + 1
-            if right_end_number <= 10:
-                candidate_card_set.add((color, right_end_number))
-
-    # check by number
-    for number in range(1, 11):
-        same_number_list = [card for card in p0_card_list if card.number == number]
-        # if a number group contains 2 different colors, then the other 2 colors are qualified
-        color_set = {'red', 'blue', 'green', 'yellow'}
-        for card in same_number_list:
-            # every time it removes the color of the already
-            # discard() is a safe way of removing a color that don't even in the set
-            color_set.discard(card.colour)
-        if len(color_set) <= 1:
-            return 1
-        if len(color_set) == 2:
-            candidate_card_set.add((color_set.pop(), number))
-            candidate_card_set.add((color_set.pop(), number))
-
-    # unique candidate set was formed
-    # now figure out what remains in card deck
+    def estimate_turns_to_empty(self):
+        # A cheap heuristic for the AI: how many own turns it takes to empty the collection if nobody interferes
+        return turns_to_empty(tuple(card_to_index(card.colour, card.number) for card in self.collection))
+
+    def find_best_valid_group(self):
+        # the valid group that leaves the collection quickest to empty, see estimate_turns_to_empty
+        group = best_group_to_dispose([card_to_index(card.colour, card.number) for card in self.collection])
+        if group is None:
+            return None
+        cards = list(self.collection)
+        best_valid_group = []
+        for index in group:
+            card = next(card for card in cards if card_to_index(card.colour, card.number) == index)
+            cards.remove(card)
+            best_valid_group.append(card)
+        return best_valid_group
+
+def card_to_index(color, number):
     # map every unique card to an integer from 0 to 39
-    def card_to_index(color, number):
-        return ['red', 'blue', 'green', 'yellow'].index(color) * 10 + number - 1
-
-    card_deck = [2] * (4 * 10)  # full card deck
-    for player in player_list:
-        for card in player.collection:
-            index = card_to_index(card.colour, card.number)
-            card_deck[index] -= 1
-
-    deck_count = sum(card_deck)  # How many cards are there left in the deck
-    effective_card_count = 0
-    for card_tuple in candidate_card_set:
-        index = card_to_index(card_tuple[0], card_tuple[1])  # calculate the number of qualified cards left in the deck
-        effective_card_count += card_deck[index]
-
-    # print(candidate_card_set)
-    # print(deck_count)
-    # print(card_deck)
-    return effective_card_count / deck_count   # the final result
+    return ['red', 'blue', 'green', 'yellow'].index(color) * 10 + number - 1
+
+def index_to_card_tuple(index):
+    # the inverse of card_to_index, e.g. 14 -> ('blue', 5)
+    return ['red', 'blue', 'green', 'yellow'][index // 10], index % 10 + 1
 
 class GameLogicActor:
     def __init__(self, game_manager):
@@ -385,6 +325,9 @@ class PlayerOptions(Enum):
     PASS = 12
 
 class PlayerInput:
+    # the turns of a computer player can be sped up, see TimeScale.skip_ai_animations
+    is_computer = False
+
     def __init__(self):
         self.player = None
         self.active = False
@@ -404,6 +347,19 @@ class PlayerInput:
     def evaluate_situation_and_response(self):
         pass
 
+    def join_game(self):
+        """
+        Called once the player of the input is in the game, before any card of the game is dealt when the player is
+        added at the start
+        """
+        pass
+
+    def leave_game(self):
+        """
+        Called when the input stops playing for its player, e.g. when set_input replaces it
+        """
+        pass
+
     def add_on_activate_listener(self, on_activate_listener):
         self.on_activate_listener_list.append(on_activate_listener)
 
@@ -411,36 +367,78 @@ class PlayerInput:
         self.on_deactivate_listener_list.append(on_deactivate_listener)
 
 class AIPlayerInput(PlayerInput):
+    is_computer = True
+
     def __init__(self):
         super().__init__()
         self.valid_group_memory = None
         self.other_player_memory = None
+        # True: draw from other player, False: draw from deck, None: do not draw this turn
+        self.draw_action_memory = False
+        self.card_memory = None
+
+    def join_game(self):
+        # the memory follows the game from here on, so it sees the steals and disposals made before the first turn
+        if self.card_memory is None or self.card_memory.owner is not self.player:
+            self.leave_game()
+            self.card_memory = CardMemory(self.player)
+
+    def leave_game(self):
+        # an old memory would keep listening to the game otherwise
+        if self.card_memory is not None:
+            self.card_memory.detach()
+            self.card_memory = None
 
     def activate(self):
         super().activate()
+        self.join_game()
+        # the draw action is decided once at the beginning of the turn
+        self.draw_action_memory = self.choose_draw_action()
         print("Player AI input activated")
 
     def deactivate(self):
         super().deactivate()
         print("Player AI input deactivated")
 
+    def choose_draw_action(self):
+        """
+        Decide how to draw cards this turn, subclasses may override it to provide a better policy
+        :return: True to draw from other player, False to draw from the deck, None to skip drawing
+        """
+        return random.choice([True, False])
+
+    def choose_other_player(self):
+        """
+        Decide which player to draw a card from, taking the last card of a player makes that player win
+        :return: the player whose blind steal is worth the most, None when nobody has more than 1 card
+        """
+        candidates = [player for player in self.player.game_manager.players
+                      if player is not self.player and player.card_count() > 1]
+        if len(candidates) == 0:
+            return None
+        if self.card_memory is None:
+            return random.choice(candidates)
+        scores = self.card_memory.steal_values(candidates)
+        return candidates[scores.index(max(scores))]
+
+    def choose_valid_group(self):
+        """
+        Decide which valid group to dispose next, subclasses may override it to provide a better policy
+        :return: a list of cards in the collection, None when nothing should be disposed
+        """
+        return self.player.find_largest_valid_group()
+
     def evaluate_situation_and_response(self):
         if not self.active:
             print("Player AI input is deactivated")
             return
         player_status = self.player.game_manager.get_player_status(self.player)
-        draw_from_other_player = random.choice([True, False])
+        draw_from_other_player = self.draw_action_memory
         if player_status.turn_end:
             self.deactivate()
-        elif not player_status.draw_from_other_player_start and not player_status.start_draw_from_deck and draw_from_other_player and self.player.card_count() < 20:
-            players = self.player.game_manager.players
-            players.remove(self.player)
-            other_player = random.choice(players)
-            if other_player.card_count() <= 1:
-                players.remove(other_player)
-                if len(players) > 0:
-                    other_player = random.choice(players)
-            if other_player.card_count() <= 1:
+        elif not player_status.draw_from_other_player_start and not player_status.start_draw_from_deck and draw_from_other_player is True and self.player.card_count() < 20:
+            other_player = self.choose_other_player()
+            if other_player is None:
                 self.player.pass_turn() # todo:
             else:
                 self.player.start_draw_from_other_player(other_player)
@@ -457,7 +455,7 @@ class AIPlayerInput(PlayerInput):
             print("player.draw_from_other_player(self.other_player_memory, card)")
         elif not player_status.draw_from_other_player_end and player_status.have_drawn_from_other_player:
             self.player.end_draw_from_other_player()
-        elif not player_status.start_draw_from_deck and not player_status.draw_from_other_player_start and not draw_from_other_player and self.player.card_count() < 20:
+        elif not player_status.start_draw_from_deck and not player_status.draw_from_other_player_start and draw_from_other_player is False and self.player.card_count() < 20:
             deck = self.player.game_manager.deck
             if not deck.empty():
                 self.player.start_draw_from_deck()
@@ -476,7 +474,7 @@ class AIPlayerInput(PlayerInput):
             if card_need_deselect is not None:
                 self.player.deselect_card(card_need_deselect)
             else:
-                self.valid_group_memory = self.player.find_largest_valid_group()
+                self.valid_group_memory = self.choose_valid_group()
                 if self.valid_group_memory is None:
                     self.player.pass_turn()
                 else:
@@ -491,6 +489,14 @@ class AIPlayerInput(PlayerInput):
             else:
                 print("This branch should not be executed")
 
+class PlanningAIPlayerInput(AIPlayerInput):
+    """
+    Disposes the group that leaves the hand quickest to empty, see CollectionOfCards.estimate_turns_to_empty.
+    The search can take a noticeable time on a large hand, so it is meant for the arena rather than the UI
+    """
+    def choose_valid_group(self):
+        return self.player.find_best_valid_group()
+
 class IPlayerAgentListener:
     def draw_start_cards(self, job):
         pass
@@ -531,6 +537,266 @@ class IPlayerAgentListener:
     def end_draw_from_other_player(self, job):
         pass
 
+class CardMemory(IPlayerAgentListener):
+    """
+    What a player knows about where every card is, built from the actions of all the players.
+    Cards are tracked by index (see card_to_index), every event only touches the cards it moves.
+    AIPlayerInput reads it to choose whom to steal from, see steal_values, and it answers the probability queries
+    of the owner, see probability_of_valid_group.
+    """
+    DECK = 'deck'  # went back to the deck through a disposed group
+    UNSEEN = 'unseen'  # in the deck or hidden in another hand
+
+    def __init__(self, owner):
+        self.owner = owner
+        self._counts = {CardMemory.DECK: [0] * 40, CardMemory.UNSEEN: [2] * 40}
+        self._known_totals = {}
+        self._hand_counts = {}
+        self._pending_deck_draws = []
+        # player -> indices of the cards the player has selected to dispose
+        self._selected = {}
+        for player in owner.game_manager.players:
+            self._add_location(player)
+            self._hand_counts[player] = player.card_count()
+        for card in owner.card_as_list():
+            self._move(card_to_index(card.colour, card.number), CardMemory.UNSEEN, owner)
+        owner.game_manager.add_player_action_listener(self)
+
+    def detach(self):
+        """
+        Stop following the game, the memory is not updated any more
+        """
+        self.owner.game_manager.remove_player_action_listener(self)
+
+    def _add_location(self, player):
+        if player not in self._counts:
+            self._counts[player] = [0] * 40
+            self._known_totals[player] = 0
+            self._hand_counts[player] = 0
+
+    def _move(self, index, source, target):
+        counts = self._counts
+        if counts[source][index] == 0:
+            # the card was somewhere we could not see
+            source = CardMemory.UNSEEN if counts[CardMemory.UNSEEN][index] > 0 else CardMemory.DECK
+            if counts[source][index] == 0:
+                print(f"Warning: card memory lost track of card {index}")
+                return
+        counts[source][index] -= 1
+        counts[target][index] += 1
+        if source in self._known_totals:
+            self._known_totals[source] -= 1
+        if target in self._known_totals:
+            self._known_totals[target] += 1
+
+    def _forget_deck(self):
+        # another player drew blind from the deck, so the disposed cards may be in that hand now
+        deck = self._counts[CardMemory.DECK]
+        unseen = self._counts[CardMemory.UNSEEN]
+        for index in range(40):
+            if deck[index] > 0:
+                unseen[index] += deck[index]
+                deck[index] = 0
+
+    def known_cards(self, player):
+        """
+        :return: list of 40 numbers, how many copies of each card are known to be in the hand of the player
+        """
+        # the players added after the owner are tracked from their first query or event
+        self._add_location(player)
+        return self._counts[player]
+
+    def hand_count(self, player):
+        self._add_location(player)
+        return self._hand_counts[player]
+
+    def hidden_count(self, player):
+        # the cards in the hand of the player that nobody has seen
+        self._add_location(player)
+        return self._hand_counts[player] - self._known_totals[player]
+
+    def deck_count(self, index):
+        # known to be in the deck because they were disposed
+        return self._counts[CardMemory.DECK][index]
+
+    def unseen_count(self, index):
+        return self._counts[CardMemory.UNSEEN][index]
+
+    def completing_cards(self):
+        """
+        :return: list of 40 numbers, 1 for the cards that would make a valid group with the hand of the owner
+        """
+        hand = self._counts[self.owner]
+        completing = [0] * 40
+        for index in range(40):
+            number = index % 10
+            color_base = index - number
+            # same number, at least 2 other colours in hand
+            if sum(1 for color in range(4) if color * 10 + number != index and hand[color * 10 + number] > 0) >= 2:
+                completing[index] = 1
+                continue
+            # same colour, 2 neighbours in a row
+            neighbours = [number + offset for offset in (-2, -1, 1, 2)]
+            present = [0 <= n <= 9 and hand[color_base + n] > 0 for n in neighbours]
+            if (present[0] and present[1]) or (present[1] and present[2]) or (present[2] and present[3]):
+                completing[index] = 1
+        return completing
+
+    def probability_of_valid_group(self):
+        """
+        :return: 1 when the hand of the owner holds a valid group, otherwise the chance that the next card drawn from
+        the deck makes one with the hand
+        """
+        completing = self.completing_cards()
+        hand = self._counts[self.owner]
+        # a card of the hand that completes a group with the rest of the hand
+        if any(hand[i] > 0 and completing[i] for i in range(40)):
+            return 1
+        deck = self._counts[CardMemory.DECK]
+        unseen = self._counts[CardMemory.UNSEEN]
+        unseen_total = sum(unseen)
+        # the unseen cards are either in the deck or hidden in another hand, each of them as likely as the others
+        hidden_total = sum(self.hidden_count(player) for player in self._hand_counts if player is not self.owner)
+        unseen_in_deck = max(0, unseen_total - hidden_total)
+        deck_total = sum(deck) + unseen_in_deck
+        if deck_total == 0:
+            return 0
+        unseen_share = unseen_in_deck / unseen_total if unseen_total > 0 else 0
+        return sum((deck[i] + unseen[i] * unseen_share) * completing[i] for i in range(40)) / deck_total
+
+    def steal_values(self, players, help_penalty=0.5):
+        """
+        Score a blind steal from each player in one pass over the cards.
+        A hidden card is expected to be like any unseen card, the known cards of a player are counted as they are.
+        Taking a card also brings the player closer to an empty hand, which costs more when the hand is small.
+        :return: list of scores in the same order as players
+        """
+        if numpy is not None and len(players) > 0:
+            return self._steal_values_batch(players, help_penalty)
+        completing = self.completing_cards()
+        unseen = self._counts[CardMemory.UNSEEN]
+        unseen_total = sum(unseen)
+        hidden_value = 0
+        if unseen_total > 0:
+            hidden_value = sum(unseen[i] * completing[i] for i in range(40)) / unseen_total
+        # only the cards that would complete a group matter for the known part
+        useful = [i for i in range(40) if completing[i]]
+        scores = []
+        for player in players:
+            hand_count = self._hand_counts[player]
+            if hand_count <= 0:
+                scores.append(float('-inf'))
+                continue
+            known = self._counts[player]
+            known_value = sum(known[i] for i in useful)
+            hidden = hand_count - self._known_totals[player]
+            scores.append((known_value + hidden * hidden_value) / hand_count - help_penalty / hand_count)
+        return scores
+
+    def _steal_values_batch(self, players, help_penalty):
+        # steal_values for all the players and all their hidden cards at once, the hand of the owner is a row per
+        # colour so that completing_cards becomes a few shifted comparisons
+        present = numpy.array(self._counts[self.owner]).reshape(4, 10) > 0
+        other_colors = present.sum(axis=0) - present
+        padded = numpy.zeros((4, 14), dtype=bool)
+        padded[:, 2:12] = present
+        (two_below, below, above, two_above) = (padded[:, 0:10], padded[:, 1:11], padded[:, 3:13], padded[:, 4:14])
+        completing = ((other_colors >= 2) | (two_below & below) | (below & above) | (above & two_above)).ravel()
+        unseen = numpy.array(self._counts[CardMemory.UNSEEN])
+        unseen_total = unseen.sum()
+        hidden_value = unseen @ completing / unseen_total if unseen_total > 0 else 0.0
+        known = numpy.array([self._counts[player] for player in players])
+        hand_counts = numpy.array([self._hand_counts[player] for player in players], dtype=float)
+        hidden = hand_counts - numpy.array([self._known_totals[player] for player in players])
+        scores = (known @ completing + hidden * hidden_value - help_penalty) / numpy.maximum(hand_counts, 1)
+        return numpy.where(hand_counts > 0, scores, -numpy.inf).tolist()
+
+    # IPlayerAgentListener implementation methods
+    def draw_start_cards(self, job):
+        player = job.player
+
+        def on_draw_start_cards():
+            self._add_location(player)
+            self._hand_counts[player] = player.card_count()
+            if player is self.owner:
+                for card in player.card_as_list():
+                    self._move(card_to_index(card.colour, card.number), CardMemory.UNSEEN, player)
+        job.add_start_evoke_listener(on_draw_start_cards)
+
+    def draw_card_from_deck(self, job):
+        player = job.player
+        buffer = player.game_manager.draw_card_buffer
+
+        def on_draw_card_from_deck():
+            if player is self.owner:
+                card = buffer.card_as_list()[-1]
+                self._pending_deck_draws.append(card_to_index(card.colour, card.number))
+            else:
+                self._forget_deck()
+        job.add_start_evoke_listener(on_draw_card_from_deck)
+
+    def end_draw_card_from_deck(self, job):
+        player = job.player
+
+        def on_end_draw_card_from_deck():
+            self._hand_counts[player] = player.card_count()
+            if player is self.owner:
+                for index in self._pending_deck_draws:
+                    self._move(index, CardMemory.DECK, player)
+                self._pending_deck_draws = []
+        job.add_start_evoke_listener(on_end_draw_card_from_deck)
+
+    def select_card(self, card, job):
+        player = job.player
+        index = card_to_index(card.colour, card.number)
+        job.add_start_evoke_listener(lambda: self._selected.setdefault(player, []).append(index))
+
+    def deselect_card(self, card, job):
+        player = job.player
+        index = card_to_index(card.colour, card.number)
+
+        def on_deselect_card():
+            selected = self._selected.get(player, [])
+            if index in selected:
+                selected.remove(index)
+        job.add_start_evoke_listener(on_deselect_card)
+
+    def dispose_selected(self, job):
+        player = job.player
+
+        def on_dispose_selected():
+            # the selection as it was when the job ran, the job has taken the cards out of the hand already
+            indices = self._selected.pop(player, [])
+            for index in indices:
+                self._move(index, player, CardMemory.DECK)
+            self._hand_counts[player] -= len(indices)
+        job.add_start_evoke_listener(on_dispose_selected)
+
+    def pass_turn(self, job):
+        player = job.player
+
+        def on_pass_turn():
+            # the cards left in the buffer go back to the deck
+            if player is self.owner:
+                for index in self._pending_deck_draws:
+                    self._move(index, CardMemory.UNSEEN, CardMemory.DECK)
+                self._pending_deck_draws = []
+            # the end of a turn clears every selection
+            self._selected.clear()
+        job.add_start_evoke_listener(on_pass_turn)
+
+    def draw_from_other_player(self, other_player, card, job):
+        player = job.player
+        index = card_to_index(card.colour, card.number)
+
+        def on_draw_from_other_player():
+            # the stolen card is shown to everyone
+            self._move(index, other_player, player)
+            self._hand_counts[other_player] -= 1
+            self._hand_counts[player] += 1
+        job.add_start_evoke_listener(on_draw_from_other_player)
+
+
 class PlayerAgent(GameLogicActor):
     def __init__(self, game_manager, player_input):
         super().__init__(game_manager)
@@ -542,12 +808,19 @@ class PlayerAgent(GameLogicActor):
         player_input.player = self
 
     def set_input(self, player_input: PlayerInput):
+        if player_input is not self.player_input:
+            self.player_input.leave_game()
         self.player_input = player_input
         player_input.player = self
+        if self in self.game_manager.players:
+            player_input.join_game()
 
     def add_action_listener(self, player_agent_listener: IPlayerAgentListener):
         self._action_listeners.append(player_agent_listener)
 
+    def remove_action_listener(self, player_agent_listener: IPlayerAgentListener):
+        self._action_listeners.remove(player_agent_listener)
+
     def card_as_list(self):
         return self._collection.collection.copy()
 
@@ -631,6 +904,12 @@ class PlayerAgent(GameLogicActor):
     def find_largest_valid_group(self):
         return self._collection.find_largest_valid_group()
 
+    def estimate_turns_to_empty(self):
+        return self._collection.estimate_turns_to_empty()
+
+    def find_best_valid_group(self):
+        return self._collection.find_best_valid_group()
+
     def draw_start_cards(self):
         deck = self.game_manager.deck
         job = PlayerDrawStartCardJob(deck, self, 0.3)
@@ -769,12 +1048,40 @@ class Deck:
         return self._collection.collection.copy()
 
 class GameJob:
-    def __init__(self, function, duration = 0):
+    # the longest a job waits for a handle, so that one that is never done can not hold up the game
+    MAX_AWAIT_TIME = 1.0
+
+    def __init__(self, function, duration = 0, min_duration = 0):
+        """
+        :param duration: seconds the job lasts, unless it awaits completion
+        :param min_duration: the shortest a job that awaits completion lasts
+        """
         self._function = function
         self._duration = duration
+        self.min_duration = min_duration
         self._start_evoke_listener_list = []
         self._end_evoke_listener_list = []
         self._time_left = duration
+        self._elapsed = 0
+        self._awaits_completion = False
+        self._awaited_handles = []
+        self._await_deadline = 0
+        self.ended = False
+        # False for the small steps of a longer action, which last min_duration and let what they started play on
+        # into the next steps
+        self.blocking = True
+
+    def await_completion(self, *handles):
+        """
+        Let the job last until the handles are done instead of for its duration, e.g. the animations that show it,
+        see Animation.play_animation. It still lasts min_duration, so without any handle it lasts just that.
+        Handles awaited after end_evoke keep the job from being taken off the job system until they are done
+        :param handles: anything with a done attribute
+        """
+        self._awaits_completion = True
+        if len(handles) > 0 and self.blocking:
+            self._awaited_handles.extend(handles)
+            self._await_deadline = max(self._await_deadline, self._elapsed + self.MAX_AWAIT_TIME)
 
     def add_start_evoke_listener(self, function):
         self._start_evoke_listener_list.append(function)
@@ -788,18 +1095,24 @@ class GameJob:
             listener()
 
     def end_evoke(self):
+        self.ended = True
         for listener in self._end_evoke_listener_list:
             listener()
 
     def update(self, dt):
         self._time_left -= dt
+        self._elapsed += dt
 
     def finished(self):
-        return self._time_left <= 0
+        if not self._awaits_completion:
+            return self._time_left <= 0
+        if self._elapsed < self.min_duration:
+            return False
+        return self._elapsed >= self._await_deadline or all(handle.done for handle in self._awaited_handles)
 
 class PlayerGameJob(GameJob):
-    def __init__(self, player_option, player, function, duration = 0):
-        super().__init__(function, duration)
+    def __init__(self, player_option, player, function, duration = 0, min_duration = 0):
+        super().__init__(function, duration, min_duration)
         self.player_option = player_option
         self.player = player
 
@@ -833,6 +1146,7 @@ def start_turn_wrapper(player):
     def start_turn():
         index = player.game_manager.players.index(player)
         player.game_manager.player_turn = index
+        time_scale.computer_turn = player.player_input.is_computer
         print(f"{index} player turn")
     return start_turn
 
@@ -907,7 +1221,8 @@ class DrawCardFromDeckJob(PlayerGameJob):
     def __init__(self, player, duration = 0.1):
         deck = player.game_manager.deck
         buffer = player.game_manager.draw_card_buffer
-        super().__init__(PlayerOptions.DRAW_CARD_FROM_DECK, player, draw_card_from_deck_wrapper(deck, buffer),duration)
+        super().__init__(PlayerOptions.DRAW_CARD_FROM_DECK, player, draw_card_from_deck_wrapper(deck, buffer),duration, min_duration = duration)
+        self.blocking = False
         self.add_start_evoke_listener(player.game_manager.get_player_status(player).draw_card_from_deck_to_buffer)
         self.add_end_evoke_listener(player.player_input.evaluate_situation_and_response)
 
@@ -946,13 +1261,15 @@ class EndDrawFromOtherPlayerJob(PlayerGameJob):
 
 class SelectCardFromCollectionJob(PlayerGameJob):
     def __init__(self, player, card, duration = 0.1):
-        super().__init__(PlayerOptions.SELECT_CARD_FROM_COLLECTION, player, lambda : player.mark_card_selected(card), duration = duration)
+        super().__init__(PlayerOptions.SELECT_CARD_FROM_COLLECTION, player, lambda : player.mark_card_selected(card), duration = duration, min_duration = duration)
+        self.blocking = False
         self.add_start_evoke_listener(player.game_manager.get_player_status(player).start_select_valid_group)
         self.add_end_evoke_listener(player.player_input.evaluate_situation_and_response)
 
 class DeselectCardFromCollectionJob(PlayerGameJob):
     def __init__(self, player, card, duration = 0.1):
-        super().__init__(PlayerOptions.DESELECT_CARD_FROM_COLLECTION, player, lambda : player.mark_card_unselected(card), duration = duration)
+        super().__init__(PlayerOptions.DESELECT_CARD_FROM_COLLECTION, player, lambda : player.mark_card_unselected(card), duration = duration, min_duration = duration)
+        self.blocking = False
         self.add_start_evoke_listener(player.game_manager.get_player_status(player).start_select_valid_group)
         self.add_end_evoke_listener(player.player_input.evaluate_situation_and_response)
 
@@ -977,26 +1294,73 @@ class JobEvokeSystem:
         self._job_queue = queue.Queue()
         self._current_job = None
         self.paused = False
+        self._push_listeners = []
+        self._before_evoke_listeners = []
+        self._after_evoke_listeners = []
 
     def push_job(self, job):
         self._job_queue.put(job)
+        for push_listener in self._push_listeners:
+            push_listener(job)
+
+    def add_push_listener(self, push_listener):
+        self._push_listeners.append(push_listener)
+
+    def add_evoke_listeners(self, before_evoke_listener, after_evoke_listener):
+        """
+        Listeners called with the job around both its evoke and its end_evoke
+        :param before_evoke_listener: called right before the job or its listeners run
+        :param after_evoke_listener: called once they have run, even when they raised, e.g. to make the job await
+        the animations they started
+        """
+        self._before_evoke_listeners.append(before_evoke_listener)
+        self._after_evoke_listeners.append(after_evoke_listener)
+
+    def _around_evoke(self, job, evoke):
+        for before_evoke_listener in self._before_evoke_listeners:
+            before_evoke_listener(job)
+        try:
+            evoke()
+        finally:
+            for after_evoke_listener in self._after_evoke_listeners:
+                after_evoke_listener(job)
+
+    def _end_current_job_if_finished(self):
+        """
+        :return: True when the current job has ended and was taken off
+        """
+        job = self._current_job
+        if not job.ended and job.finished():
+            self._around_evoke(job, job.end_evoke)
+        # whatever end_evoke started is awaited too
+        if job.ended and job.finished():
+            self._current_job = None
+            return True
+        return False
+
+    def has_pending_jobs(self):
+        """
+        :return: True when a job is running or waiting, a paused system never runs its jobs
+        """
+        if self.paused:
+            return False
+        return self._current_job is not None or not self._job_queue.empty()
 
     def update(self, dt):
+        """
+        :param dt: seconds of real time, run at the speed of time_scale
+        """
         if self.paused:
             return
+        dt = time_scale.scale_dt(dt)
         if self._current_job is not None:
             self._current_job.update(dt)
-            if self._current_job.finished():
-                self._current_job.end_evoke()
-                self._current_job = None
+            self._end_current_job_if_finished()
         if self._current_job is None:
             while not self._job_queue.empty():
                 self._current_job = self._job_queue.get()
-                self._current_job.evoke()
-                if self._current_job.finished():
-                    self._current_job.end_evoke()
-                    self._current_job = None
-                else:
+                self._around_evoke(self._current_job, self._current_job.evoke)
+                if not self._end_current_job_if_finished():
                     break
 
 class GamePlayerStatus:
@@ -1172,8 +1536,10 @@ class GameManager(GameLogicActor):
         self.game_procedure = GameProcedure.GAME_START
         self.game_instance = game_instance
         self.player_turn = -1
+        time_scale.computer_turn = False
         game_instance.add_actor(self)
         self._game_result_listeners = []
+        self._player_action_listeners = []
         self._job_manager.push_job(GameJob( lambda :None, 0.5))
 
     @property
@@ -1193,6 +1559,20 @@ class GameManager(GameLogicActor):
 
     def add_player(self, player):
         self._player_status_dict[player] = GamePlayerStatus(player)
+        for listener in self._player_action_listeners:
+            player.add_action_listener(listener)
+        player.player_input.join_game()
+
+    def add_player_action_listener(self, player_agent_listener):
+        # listen to the actions of every player, including the players added later
+        self._player_action_listeners.append(player_agent_listener)
+        for player in self.players:
+            player.add_action_listener(player_agent_listener)
+
+    def remove_player_action_listener(self, player_agent_listener):
+        self._player_action_listeners.remove(player_agent_listener)
+        for player in self.players:
+            player.remove_action_listener(player_agent_listener)
 
     def add_actor(self, actor):
         self.game_instance.add_actor(actor)
@@ -1200,6 +1580,15 @@ class GameManager(GameLogicActor):
     def add_game_result_listener(self, game_result_listener):
         self._game_result_listeners.append(game_result_listener)
 
+    def add_job_scheduled_listener(self, job_scheduled_listener):
+        self._job_manager.add_push_listener(job_scheduled_listener)
+
+    def add_job_evoke_listeners(self, before_evoke_listener, after_evoke_listener):
+        self._job_manager.add_evoke_listeners(before_evoke_listener, after_evoke_listener)
+
+    def has_pending_jobs(self):
+        return self._job_manager.has_pending_jobs()
+
     def receive_request(self, job):
         if self.check_request(job):
             self._job_manager.push_job(job)
@@ -1235,7 +1624,6 @@ class GameManager(GameLogicActor):
 
 class Game:
     def __init__(self, num_of_players=2):
-        self.clock = pygame.time.Clock()
         self.update_object_set = set()
         self.game_end = False
         self.game_manager = GameManager(self)
@@ -1245,8 +1633,10 @@ class Game:
             self.update_object_set.add(game_logic_actor)
             game_logic_actor.start()
 
-    def update(self):
-        dt = self.clock.tick(60)/1000
+    def update(self, dt):
+        """
+        :param dt: seconds of game time to advance, see FrameClock
+        """
         for o in self.update_object_set:
             o.update(dt)
 
@@ -1260,9 +1650,11 @@ class Game:
         player_1.draw_start_cards()
         player_2.draw_start_cards()
         player_3.draw_start_cards().add_end_evoke_listener(self.game_manager.start_next_player_turn)
+        clock = FrameClock()
         while not self.game_end:
-            self.update()
-            pygame.time.delay(30)
+            clock.tick()
+            for dt in clock.logic_steps():
+                self.update(dt)
 
 if __name__ == "__main__":
     Game().main()
\ No newline at end of file
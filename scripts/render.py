@@ -0,0 +1,197 @@
+import pygame
+
+BACKGROUND_LAYER = 0
+DEFAULT_LAYER = 1
+UI_LAYER = 2
+
+
+def submit(target, source, position, layer=DEFAULT_LAYER, owner=None, changed=True):
+    """
+    Draw source with its top left corner at position, in the given layer when target is a DirtyRectRenderer
+    :param target: a DirtyRectRenderer or any surface
+    :param owner: the object being drawn, see DirtyRectRenderer.blit
+    :param changed: whether the owner looks different from the last time it was drawn
+    """
+    if isinstance(target, DirtyRectRenderer):
+        return target.blit(source, position, layer=layer, owner=owner, changed=changed)
+    return target.blit(source, position)
+
+
+class DirtyRectRenderer:
+    """
+    Stands in for the display surface while a screen draws, as a render queue.
+    The blits of a frame are collected with their layer, sorted once by layer keeping the order of submission
+    within a layer, and a blit submitted again in the same frame is only kept at its last place.
+    Only the damaged regions are repainted, by replaying every blit that touches them with one Surface.blits call per
+    layer. The objects report their own damage: a blit with an owner says whether the owner changed since it was drawn
+    last, and only then the bounds it was drawn at and the new bounds are damaged, as well as the bounds of the owners
+    that appeared or were not drawn any more. The few blits without an owner, e.g. texts and highlights, are compared
+    with those of the previous frame, so their surfaces must not be changed in place.
+    """
+    # above this share of the screen one full repaint is cheaper than many small ones
+    FULL_REDRAW_RATIO = 0.5
+
+    def __init__(self, display):
+        self.display = display
+        self._entries = []
+        # owner -> (index in _entries, rect) of its blit in this and in the previous frame
+        self._owners = {}
+        self._previous_owners = {}
+        # indices in _entries of the blits without an owner, and their keys in the previous frame
+        self._anonymous = []
+        self._previous_anonymous_keys = {}
+        self._damaged_rects = []
+        self.full_redraw = True
+
+    def get_size(self):
+        return self.display.get_size()
+
+    def get_width(self):
+        return self.display.get_width()
+
+    def get_height(self):
+        return self.display.get_height()
+
+    def get_rect(self, **kwargs):
+        return self.display.get_rect(**kwargs)
+
+    def blit(self, source, dest, area=None, special_flags=0, layer=DEFAULT_LAYER, owner=None, changed=True):
+        """
+        :param owner: the object being drawn, it is not compared with the previous frame but reports its changes
+        :param changed: whether the owner looks different from the last time it was drawn, ignored without owner
+        """
+        if isinstance(dest, pygame.Rect):
+            dest = dest.topleft
+        size2d = area.size if area is not None else source.get_size()
+        rect = pygame.Rect(dest, size2d)
+        if owner is None:
+            self._anonymous.append(len(self._entries))
+        else:
+            drawn = self._owners.get(owner)
+            if drawn is not None:
+                # drawn again in the same frame, only the last one ends up on top
+                self._entries[drawn[0]] = None
+            self._owners[owner] = (len(self._entries), rect)
+            if changed:
+                previous = self._previous_owners.get(owner)
+                if previous is not None:
+                    self._damaged_rects.append(previous[1])
+                self._damaged_rects.append(rect)
+        self._entries.append((layer, source, rect, area, special_flags))
+        return rect
+
+    def fill(self, color, rect=None, special_flags=0, layer=BACKGROUND_LAYER):
+        rect = pygame.Rect(rect) if rect is not None else self.display.get_rect()
+        self._anonymous.append(len(self._entries))
+        self._entries.append((layer, tuple(color), rect, None, special_flags))
+        return rect
+
+    def invalidate(self, rect=None):
+        """
+        Repaint a region in this frame even if the same surfaces are drawn there, e.g. after a surface changed in place
+        or the display was drawn on directly
+        :param rect: the region, None for the whole screen
+        """
+        if rect is None:
+            self.full_redraw = True
+        else:
+            self._damaged_rects.append(pygame.Rect(rect))
+
+    def begin_frame(self):
+        self._entries = []
+        self._owners = {}
+        self._anonymous = []
+
+    def end_frame(self):
+        """
+        Paint the changes of the frame on the display
+        :return: list of rects of the display that changed, to be passed to pygame.display.update
+        """
+        anonymous_keys = self._anonymous_keys()
+        screen_rect = self.display.get_rect()
+        if self.full_redraw:
+            dirty_rects = [screen_rect]
+        else:
+            dirty_rects = self._damaged_rects + self._owner_changes() + self._anonymous_changes(anonymous_keys)
+            dirty_rects = self._merge([rect.clip(screen_rect) for rect in dirty_rects])
+            if sum(rect.width * rect.height for rect in dirty_rects) > \
+                    screen_rect.width * screen_rect.height * self.FULL_REDRAW_RATIO:
+                dirty_rects = [screen_rect]
+        if len(dirty_rects) > 0:
+            self._repaint(dirty_rects)
+        self.full_redraw = False
+        self._damaged_rects = []
+        self._previous_owners = self._owners
+        # the previous surfaces are kept alive by the keys, so a new surface can never be mistaken for one by id
+        self._previous_anonymous_keys = anonymous_keys
+        return dirty_rects
+
+    def _repaint(self, dirty_rects):
+        # sort is stable, so the order of submission is kept within a layer
+        entries = [entry for entry in self._entries if entry is not None]
+        entries.sort(key=lambda entry: entry[0])
+        for dirty_rect in dirty_rects:
+            self.display.set_clip(dirty_rect)
+            batch = []
+            batch_layer = None
+            for (layer, source, rect, area, special_flags) in entries:
+                if not rect.colliderect(dirty_rect):
+                    continue
+                if layer != batch_layer or isinstance(source, tuple):
+                    self._flush(batch)
+                    batch_layer = layer
+                if isinstance(source, tuple):
+                    self.display.fill(source, rect, special_flags)
+                else:
+                    batch.append((source, rect.topleft, area, special_flags))
+            self._flush(batch)
+        self.display.set_clip(None)
+
+    def _flush(self, batch):
+        if len(batch) > 0:
+            self.display.blits(batch, doreturn=False)
+            batch.clear()
+
+    def _owner_changes(self):
+        # the owners drawn last frame and not any more, and the other way round
+        previous = self._previous_owners
+        current = self._owners
+        return [previous[owner][1] for owner in previous.keys() - current.keys()] + \
+               [current[owner][1] for owner in current.keys() - previous.keys()]
+
+    def _anonymous_keys(self):
+        # key -> (index, source, rect) of the blits without an owner, a blit submitted again is only kept at the last
+        # place
+        keys = {}
+        for index in self._anonymous:
+            entry = self._entries[index]
+            key = self._entry_key(entry)
+            if key in keys:
+                self._entries[keys[key][0]] = None
+            keys[key] = (index, entry[1], entry[2])
+        return keys
+
+    @staticmethod
+    def _entry_key(entry):
+        (layer, source, rect, area, special_flags) = entry
+        return (layer, source if isinstance(source, tuple) else id(source), tuple(rect),
+                tuple(area) if area is not None else None, special_flags)
+
+    def _anonymous_changes(self, anonymous_keys):
+        previous = self._previous_anonymous_keys
+        return [anonymous_keys[key][2] for key in anonymous_keys.keys() - previous.keys()] + \
+               [previous[key][2] for key in previous.keys() - anonymous_keys.keys()]
+
+    @staticmethod
+    def _merge(rects):
+        # overlapping rects are joined so that no region is painted twice
+        merged = []
+        for rect in rects:
+            if rect.width <= 0 or rect.height <= 0:
+                continue
+            index = rect.collidelist(merged)
+            while index >= 0:
+                rect = rect.union(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
@@ -0,0 +1,397 @@
+import itertools
+import mmap
+import os
+import struct
+import sys
+from multiprocessing import Pool
+
+import scripts.main as core
+from scripts.card_symmetry import canonical_position, canonical_union
+
+# The endgame tablebase solves two-player positions where both hands are known and nobody draws from the deck.
+# Stealing a card only moves it from one hand to the other and disposing a valid group removes cards from the game,
+# so the total number of cards in both hands never grows and the positions up to a given total form a closed game.
+# A position is (hand of the player to move, hand of the other player), every hand is a sorted tuple of card indices.
+
+TABLEBASE_MAGIC = b'NTTB'
+TABLEBASE_VERSION = 1
+# magic, version, max total card count, slot count, entry count
+HEADER_STRUCT = struct.Struct('<4sHHII')
+# key, value, distance, flags
+SLOT_STRUCT = struct.Struct('<QbBB')
+# the maximum number of cards the 64 bit key can encode
+MAX_TOTAL_LIMIT = 10
+
+FLAG_STEAL = 1
+DISTANCE_UNKNOWN = 255
+VALUE_SCALE = 127
+# prefer quick wins and slow losses, also makes the repeated pass loops converge to a draw
+DISCOUNT = 0.99
+# action values closer than this are equal, the value iteration only converges to about its tolerance
+VALUE_EPSILON = 1e-6
+# generated by running this module, the player inputs look for the table here when no other file is given
+DEFAULT_TABLEBASE_PATH = os.path.join("resources", "tablebase", "endgame.ntb")
+
+
+def is_valid_group(indices):
+    # the same rules as CollectionOfCards.static_is_valid_group, but on card indices
+    if len(indices) < 3:
+        return False
+    colors = {index // 10 for index in indices}
+    numbers = sorted(index % 10 for index in indices)
+    if len(colors) == 1:
+        return all(numbers[i + 1] - numbers[i] == 1 for i in range(len(numbers) - 1))
+    return len(indices) <= 4 and len(colors) == len(indices) and numbers[0] == numbers[-1]
+
+
+def _remove(hand, cards):
+    rest = list(hand)
+    for card in cards:
+        rest.remove(card)
+    return tuple(rest)
+
+
+_discard_options_cache = {}
+
+
+def discard_options(hand):
+    """
+    Find every hand reachable by disposing valid groups one after another
+    :param hand: sorted tuple of card indices
+    :return: dict of remaining hand -> list of groups to dispose to get there, the hand itself is always included
+    """
+    if hand in _discard_options_cache:
+        return _discard_options_cache[hand]
+    options = {hand: []}
+    for size in range(3, len(hand) + 1):
+        for group in set(itertools.combinations(hand, size)):
+            if not is_valid_group(group):
+                continue
+            rest = _remove(hand, group)
+            for (remaining, groups) in discard_options(rest).items():
+                if remaining not in options or len(groups) + 1 < len(options[remaining]):
+                    options[remaining] = [group] + groups
+    _discard_options_cache[hand] = options
+    return options
+
+
+def encode_position(hand, other_hand):
+    # low 4 bits keep the size of the first hand, then 6 bits (index + 1) per card, the key is never 0
+    key = len(hand)
+    shift = 4
+    for index in hand + other_hand:
+        key |= (index + 1) << shift
+        shift += 6
+    return key
+
+
+def _splits(union):
+    # every way to deal the union into two non-empty hands, the first hand moves
+    splits = set()
+    for size in range(1, len(union)):
+        for hand in itertools.combinations(union, size):
+            splits.add((hand, _remove(union, hand)))
+    return sorted(splits)
+
+
+# solved values of smaller totals, shared with the worker processes
+_lower_values = {}
+
+
+def _init_worker(lower_values):
+    global _lower_values
+    _lower_values = lower_values
+
+
+def _lookup_lower(hand, other_hand):
+    return _lower_values[encode_position(*canonical_position(hand, other_hand))]
+
+
+def _after_discard_value(hand, other_hand, values):
+    # value for the player who just drew, choosing the best cards to dispose before passing the turn
+    best = -2
+    for remaining in discard_options(hand):
+        if len(remaining) == 0:
+            return 1.0
+        if len(remaining) == len(hand):
+            value = -DISCOUNT * values[(other_hand, remaining)]
+        else:
+            value = -DISCOUNT * _lookup_lower(other_hand, remaining)
+        best = max(best, value)
+    return best
+
+
+def _action_values(hand, other_hand, values):
+    keep_value = _after_discard_value(hand, other_hand, values)
+    steal_value = None
+    if len(other_hand) > 0:
+        steal_value = 0
+        for card in set(other_hand):
+            probability = other_hand.count(card) / len(other_hand)
+            rest = _remove(other_hand, (card,))
+            if len(rest) == 0:
+                # the other player wins when the last card is taken
+                outcome = -1.0
+            else:
+                outcome = _after_discard_value(tuple(sorted(hand + (card,))), rest, values)
+            steal_value += probability * outcome
+    return keep_value, steal_value
+
+
+def solve_union(union, max_iteration=2000, tolerance=1e-7):
+    """
+    Solve all the positions that deal the given cards into two hands, smaller totals must be solved already
+    :param union: sorted tuple of card indices in both hands
+    :return: list of (key, value, distance, flags)
+    """
+    positions = _splits(union)
+    values = {position: 0.0 for position in positions}
+    # the value iteration converges because of the discount
+    for _ in range(max_iteration):
+        delta = 0
+        for position in positions:
+            keep_value, steal_value = _action_values(position[0], position[1], values)
+            value = keep_value if steal_value is None else max(keep_value, steal_value)
+            delta = max(delta, abs(value - values[position]))
+            values[position] = value
+        if delta < tolerance:
+            break
+
+    entries = []
+    for position in positions:
+        keep_value, steal_value = _action_values(position[0], position[1], values)
+        steal = steal_value is not None and steal_value > keep_value + VALUE_EPSILON
+        value = steal_value if steal else keep_value
+        distance = _distance_from_value(value)
+        entries.append((encode_position(*position), value, distance, FLAG_STEAL if steal else 0))
+    return entries
+
+
+def _distance_from_value(value):
+    # a sure result in n plies is worth DISCOUNT ** (n - 1), anything uncertain is reported as unknown
+    magnitude = abs(value)
+    if magnitude < 1e-9:
+        return DISTANCE_UNKNOWN
+    plies = 1
+    while plies < DISTANCE_UNKNOWN and DISCOUNT ** (plies - 1) - magnitude > 1e-6:
+        plies += 1
+    if abs(DISCOUNT ** (plies - 1) - magnitude) > 1e-6:
+        return DISTANCE_UNKNOWN
+    return plies
+
+
+def _unions_of_size(total):
+    # the two copies of each of the 40 cards, only the canonical representatives are solved
+    seen = set()
+    for union in itertools.combinations_with_replacement(range(40), total):
+        if any(union.count(card) > 2 for card in set(union)):
+            continue
+        canonical = canonical_union(union)
+        if canonical not in seen:
+            seen.add(canonical)
+    return sorted(seen)
+
+
+def generate(max_total=4, processes=None):
+    """
+    Exhaustively solve all the two-player positions with at most max_total cards in both hands
+    :param max_total: the maximum number of cards in both hands
+    :param processes: number of worker processes, defaults to the cpu count
+    :return: dict of key -> (value, distance, flags)
+    """
+    if not 2 <= max_total <= MAX_TOTAL_LIMIT:
+        raise ValueError(f"max_total must be between 2 and {MAX_TOTAL_LIMIT}")
+    table = {}
+    lower_values = {}
+    for total in range(2, max_total + 1):
+        unions = _unions_of_size(total)
+        print(f"Solving {len(unions)} card combinations of {total} cards")
+        with Pool(processes, initializer=_init_worker, initargs=(lower_values,)) as pool:
+            for entries in pool.imap_unordered(solve_union, unions, chunksize=64):
+                for (key, value, distance, flags) in entries:
+                    table[key] = (value, distance, flags)
+                    lower_values[key] = value
+    return table
+
+
+def write_tablebase(table, path, max_total):
+    # open addressing hash table with linear probing, so a lookup only touches a couple of slots
+    slot_count = 1
+    while slot_count < len(table) * 2:
+        slot_count *= 2
+    buffer = bytearray(HEADER_STRUCT.size + slot_count * SLOT_STRUCT.size)
+    HEADER_STRUCT.pack_into(buffer, 0, TABLEBASE_MAGIC, TABLEBASE_VERSION, max_total, slot_count, len(table))
+    occupied = bytearray(slot_count)
+    for (key, (value, distance, flags)) in table.items():
+        slot = _slot_of(key, slot_count)
+        while occupied[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        occupied[slot] = 1
+        quantized = max(-VALUE_SCALE, min(VALUE_SCALE, round(value * VALUE_SCALE)))
+        SLOT_STRUCT.pack_into(buffer, HEADER_STRUCT.size + slot * SLOT_STRUCT.size, key, quantized, distance, flags)
+    with open(path, 'wb') as f:
+        f.write(buffer)
+    print(f"{len(table)} positions written to {path}")
+
+
+def _slot_of(key, slot_count):
+    # fibonacci hashing
+    return ((key * 11400714819323198485) & 0xFFFFFFFFFFFFFFFF) >> 32 & (slot_count - 1)
+
+
+class TablebaseEntry:
+    def __init__(self, value, distance, flags):
+        self.value = value
+        self.distance = distance
+        self.flags = flags
+
+    @property
+    def steal(self):
+        return bool(self.flags & FLAG_STEAL)
+
+
+class Tablebase:
+    """
+    Read-only view of a tablebase file, the file is memory mapped so nothing is loaded up front
+    """
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_total, self._slot_count, self.entry_count = HEADER_STRUCT.unpack_from(self._mmap, 0)
+        if magic != TABLEBASE_MAGIC or version != TABLEBASE_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a tablebase file of version {TABLEBASE_VERSION}")
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+    def covers(self, hand, other_hand):
+        return len(hand) > 0 and len(other_hand) > 0 and len(hand) + len(other_hand) <= self.max_total
+
+    def probe(self, hand, other_hand):
+        """
+        :param hand: card indices of the player to move
+        :param other_hand: card indices of the other player
+        :return: TablebaseEntry, None if the position is not in the table
+        """
+        if not self.covers(hand, other_hand):
+            return None
+        key = encode_position(*canonical_position(tuple(sorted(hand)), tuple(sorted(other_hand))))
+        slot = _slot_of(key, self._slot_count)
+        while True:
+            stored_key, value, distance, flags = SLOT_STRUCT.unpack_from(self._mmap, HEADER_STRUCT.size + slot * SLOT_STRUCT.size)
+            if stored_key == key:
+                return TablebaseEntry(value / VALUE_SCALE, distance, flags)
+            if stored_key == 0:
+                return None
+            slot = (slot + 1) & (self._slot_count - 1)
+
+    def best_discard(self, hand, other_hand):
+        """
+        Choose what to dispose before passing the turn
+        :return: list of groups (tuples of card indices) to dispose, None if the position is not in the table
+        """
+        if not self.covers(hand, other_hand):
+            return None
+        hand = tuple(sorted(hand))
+        other_hand = tuple(sorted(other_hand))
+        best_groups = None
+        best_value = -2
+        for (remaining, groups) in discard_options(hand).items():
+            if len(remaining) == 0:
+                return groups
+            entry = self.probe(other_hand, remaining)
+            if entry is None:
+                return None
+            if -entry.value > best_value:
+                best_value = -entry.value
+                best_groups = groups
+        return best_groups
+
+
+# path -> Tablebase, the files are only read so every player input can share one mapping
+_open_tablebases = {}
+
+
+def open_tablebase(path=None):
+    """
+    :param path: tablebase file, DEFAULT_TABLEBASE_PATH if None
+    :return: the Tablebase of the file shared between all callers, None if no path is given and the default file has
+    not been generated
+    """
+    if path is None:
+        if not os.path.exists(DEFAULT_TABLEBASE_PATH):
+            return None
+        path = DEFAULT_TABLEBASE_PATH
+    if path not in _open_tablebases:
+        _open_tablebases[path] = Tablebase(path)
+    return _open_tablebases[path]
+
+
+def _hand_indices(player):
+    return tuple(sorted(core.card_to_index(card.colour, card.number) for card in player.card_as_list()))
+
+
+class TablebasePlayerInput(core.AIPlayerInput):
+    """
+    Plays perfectly in the positions covered by the tablebase, falls back to AIPlayerInput everywhere else
+    """
+    def __init__(self, tablebase=None):
+        """
+        :param tablebase: Tablebase or the path of a tablebase file, see open_tablebase. Without a table it plays like
+        AIPlayerInput
+        """
+        super().__init__()
+        if tablebase is None or isinstance(tablebase, str):
+            tablebase = open_tablebase(tablebase)
+        self.tablebase = tablebase
+
+    def _single_opponent(self):
+        if self.player is None or self.tablebase is None:
+            return None
+        others = [player for player in self.player.game_manager.players if player is not self.player]
+        if len(others) != 1:
+            return None
+        return others[0]
+
+    def choose_draw_action(self):
+        # the table leaves out drawing from the deck, so it only decides when it knows a win without it, a draw or
+        # a loss in the table can still be turned around by drawing
+        opponent = self._single_opponent()
+        if opponent is not None:
+            entry = self.tablebase.probe(_hand_indices(self.player), _hand_indices(opponent))
+            if entry is not None and entry.value > 0:
+                return True if entry.steal else None
+        return super().choose_draw_action()
+
+    def choose_valid_group(self):
+        opponent = self._single_opponent()
+        if opponent is not None:
+            groups = self.tablebase.best_discard(_hand_indices(self.player), _hand_indices(opponent))
+            if groups is not None:
+                if len(groups) == 0:
+                    return None
+                # turn the indices back into the cards in the collection
+                cards = self.player.card_as_list()
+                group = []
+                for index in groups[0]:
+                    card = next(card for card in cards if core.card_to_index(card.colour, card.number) == index)
+                    cards.remove(card)
+                    group.append(card)
+                return group
+        return super().choose_valid_group()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate the Notty two-player endgame tablebase")
+    parser.add_argument("--max-total", type=int, default=4, help="maximum number of cards in both hands")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--out", default=DEFAULT_TABLEBASE_PATH)
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    solved_table = generate(args.max_total, args.processes)
+    write_tablebase(solved_table, args.out, args.max_total)
+    sys.exit(0)
@@ -0,0 +1,93 @@
+import math
+
+# speeds of game time
+PAUSE = 0.0
+NORMAL = 1.0
+FAST = 2.0
+FASTER = 4.0
+# every job and every animation ends in the step it is updated in
+INSTANT = math.inf
+
+# speed of the computer turns while skip_ai_animations is on
+DEFAULT_AI_SCALE = 8.0
+
+
+class TimeScale:
+    """
+    The speed of game time, shared by the job system and the animations so that what is shown stays in step with the
+    game logic whatever the speed.
+    The global scale applies to everything, an animation layer can be made faster or slower on top of it, and while
+    skip_ai_animations is on the turns of computer players run ai_scale times faster.
+    """
+    def __init__(self):
+        self.scale = NORMAL
+        self.ai_scale = DEFAULT_AI_SCALE
+        self.skip_ai_animations = False
+        # True while a computer player takes its turn, set when a turn starts
+        self.computer_turn = False
+        self._layer_scales = {}
+        self._resume_scale = NORMAL
+
+    def set_scale(self, scale):
+        """
+        :param scale: PAUSE, NORMAL, FAST, FASTER, INSTANT or any other speed that is not negative
+        """
+        if not scale >= 0:
+            raise ValueError(f"Time scale {scale} should not be negative")
+        self.scale = scale
+
+    @property
+    def paused(self):
+        return self.scale == PAUSE
+
+    def pause(self):
+        if not self.paused:
+            self._resume_scale = self.scale
+            self.scale = PAUSE
+
+    def resume(self):
+        if self.paused:
+            self.scale = self._resume_scale
+
+    def toggle_pause(self):
+        if self.paused:
+            self.resume()
+        else:
+            self.pause()
+
+    def set_layer_scale(self, layer, scale=None):
+        """
+        :param layer: animation layer, see Animation
+        :param scale: how much faster the layer runs than the rest, None removes the override
+        """
+        if scale is None:
+            self._layer_scales.pop(layer, None)
+        elif not scale >= 0:
+            raise ValueError(f"Time scale {scale} should not be negative")
+        else:
+            self._layer_scales[layer] = scale
+
+    def current_scale(self, layer=None):
+        """
+        :param layer: animation layer, None for the game logic
+        """
+        scales = [self.scale, self._layer_scales.get(layer, NORMAL)]
+        if self.skip_ai_animations and self.computer_turn:
+            scales.append(self.ai_scale)
+        # a paused clock stays paused at any speed
+        if PAUSE in scales:
+            return PAUSE
+        return math.prod(scales)
+
+    def scale_dt(self, dt, layer=None):
+        """
+        :param dt: seconds of real time
+        :return: seconds of game time
+        """
+        scale = self.current_scale(layer)
+        if scale == PAUSE or dt <= 0:
+            return 0.0
+        return dt * scale
+
+
+time_scale = TimeScale()
@@ -0,0 +1,232 @@
+import functools
+import math
+import pickle
+from collections import OrderedDict
+
+from scripts.card_symmetry import canonical_position
+
+# Estimates how many own turns a player needs to empty the hand when the other players never interfere.
+# To empty the hand every card has to end up in a valid group, so the search picks the lowest card, tries every
+# group that could contain it and recurses on the rest. The cards of a group that are not in the hand have to be
+# drawn. Draws are treated as expected-value transitions: every unseen copy of a card is drawn at the same rate, so
+# the wait for a card is the time until the first of its copies shows up. The copies in the hand and the copies
+# already counted on by another group of the same plan are not unseen any more.
+# The draws serve every group at once, so the waits of the groups of a plan overlap instead of adding up, and the
+# groups that could take the same card compete, whichever is complete first is used. Only groups that wait for
+# different cards count as competing, the groups sharing a missing card would mostly be completed by the same draw.
+# The waits of a group are combined as if they were exponential. Every turn draws up to DRAWS_PER_TURN cards, the cards that do
+# not fit are ignored.
+
+DRAWS_PER_TURN = 3
+TOTAL_CARD_COUNT = 80
+COPIES_PER_CARD = 2
+# fitted against a simulation of the draws, see _overlapping_wait
+OVERLAP_NORM = 4
+# a longer run can always be split into two runs of at least 3 cards that need the same cards
+MAX_RUN_LENGTH = 5
+
+# the least recently used positions are dropped beyond this, a search on a 20-card hand visits up to about 2000
+MAX_CACHE_SIZE = 10000
+
+# (hand, blocked cards) -> expected draws divided by the number of unseen cards, in the order of the last use, can
+# be saved to disk. Only the searches start from canonical positions, the positions within a search are not mapped
+# again, which would cost more than it saves
+_hand_cost_cache = OrderedDict()
+
+
+def _cache_get(key):
+    if key not in _hand_cost_cache:
+        return None
+    _hand_cost_cache.move_to_end(key)
+    return _hand_cost_cache[key]
+
+
+def _cache_put(key, cost):
+    _hand_cost_cache[key] = cost
+    _hand_cost_cache.move_to_end(key)
+    while len(_hand_cost_cache) > MAX_CACHE_SIZE:
+        _hand_cost_cache.popitem(last=False)
+
+
+def load_cache(path):
+    """
+    Load a memo cache saved by save_cache, the entries are merged into the current cache up to MAX_CACHE_SIZE
+    """
+    with open(path, 'rb') as f:
+        for (key, cost) in pickle.load(f).items():
+            _cache_put(key, cost)
+
+
+def save_cache(path):
+    with open(path, 'wb') as f:
+        pickle.dump(dict(_hand_cost_cache), f)
+
+
+def clear_cache():
+    _hand_cost_cache.clear()
+    _wait_for_all.cache_clear()
+
+
+def cache_size():
+    return len(_hand_cost_cache)
+
+
+def _groups_containing(index):
+    # runs of the same colour and sets of the same number that contain the card
+    color_base = index - index % 10
+    number = index % 10
+    for start in range(max(0, number - MAX_RUN_LENGTH + 1), number + 1):
+        for end in range(max(start + 2, number), min(9, start + MAX_RUN_LENGTH - 1) + 1):
+            yield tuple(color_base + n for n in range(start, end + 1))
+    other_colors = [color for color in range(4) if color != index // 10]
+    for skipped in other_colors + [None]:
+        yield tuple(sorted([index] + [color * 10 + number for color in other_colors if color != skipped]))
+
+
+def _clusters(hand):
+    # cards that can never be in the same group are solved separately, which keeps the cache small
+    clusters = []
+    for index in hand:
+        joined = [cluster for cluster in clusters if any(_related(index, other) for other in cluster)]
+        merged = [index]
+        for cluster in joined:
+            clusters.remove(cluster)
+            merged += cluster
+        clusters.append(merged)
+    return [tuple(sorted(cluster)) for cluster in clusters]
+
+
+def _related(index_1, index_2):
+    if index_1 // 10 == index_2 // 10:
+        return abs(index_1 % 10 - index_2 % 10) < MAX_RUN_LENGTH
+    return index_1 % 10 == index_2 % 10
+
+
+# the rates are small copy counts, so few different tuples ever come up
+@functools.lru_cache(maxsize=256)
+def _wait_for_all(rates):
+    # expected time until every card has shown up, by inclusion-exclusion over the first arrivals
+    wait = 0.0
+    for size in range(1, len(rates) + 1):
+        sign = 1 if size % 2 == 1 else -1
+        for subset in _subsets(rates, size):
+            wait += sign / sum(subset)
+    return wait
+
+
+def _subsets(items, size):
+    if size == 0:
+        yield ()
+        return
+    for i in range(len(items) - size + 1):
+        for rest in _subsets(items[i + 1:], size - 1):
+            yield (items[i],) + rest
+
+
+def _overlapping_wait(wait_1, wait_2):
+    # time until both of two waits are over, the draws come from one shuffled deck so the waits vary much less
+    # than exponential ones would, OVERLAP_NORM = 1 would add them up and a large one is close to the longer wait
+    if math.isinf(wait_1) or math.isinf(wait_2):
+        return math.inf
+    return (wait_1 ** OVERLAP_NORM + wait_2 ** OVERLAP_NORM) ** (1 / OVERLAP_NORM)
+
+
+def _hand_cost(hand, blocked):
+    """
+    :param hand: sorted tuple of the card indices still to be grouped
+    :param blocked: sorted tuple of the copies that can not be drawn, in the hand or counted on by the plan
+    :return: the expected number of draws until the hand can be disposed, divided by the number of unseen cards
+    """
+    if len(hand) == 0:
+        return 0.0
+    blocked = _relevant(blocked, hand)
+    key = (hand, blocked)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+    lowest = hand[0]
+    # rest of the hand -> list of (rate, copies drawn) of the groups leaving it
+    options = {}
+    for group in _groups_containing(lowest):
+        rest = list(hand[1:])
+        rates = []
+        drawn = []
+        for index in group:
+            if index == lowest:
+                continue
+            if index in rest:
+                rest.remove(index)
+                continue
+            copies = COPIES_PER_CARD - blocked.count(index) - drawn.count(index)
+            if copies <= 0:
+                rates = None
+                break
+            rates.append(copies)
+            drawn.append(index)
+        if rates is None:
+            continue
+        wait = _wait_for_all(tuple(rates))
+        rate = math.inf if wait == 0 else 1 / wait
+        options.setdefault(tuple(rest), []).append((rate, tuple(drawn)))
+    waits = []
+    for (rest, groups) in options.items():
+        groups.sort(reverse=True)
+        (total_rate, used) = (0.0, set())
+        for (rate, drawn) in groups:
+            if used.isdisjoint(drawn):
+                total_rate += rate
+                used.update(drawn)
+        # the rest is planned with the copies of the fastest group taken
+        waits.append((0.0 if math.isinf(total_rate) else 1 / total_rate, rest, groups[0][1]))
+    # the rests that wait the least first, so that the others can be cut off early
+    waits.sort()
+    best = math.inf
+    for (wait, rest, drawn) in waits:
+        if wait >= best:
+            break
+        if len(rest) > 0:
+            wait = _overlapping_wait(wait, _hand_cost(rest, tuple(sorted(blocked + drawn))))
+        best = min(best, wait)
+    _cache_put(key, best)
+    return best
+
+
+def _relevant(blocked, hand):
+    # only the copies that could be in a group with the hand matter
+    return tuple(index for index in blocked if any(_related(index, other) for other in hand))
+
+
+def turns_to_empty(hand):
+    """
+    :param hand: card indices, see card_to_index
+    :return: expected number of own turns to empty the hand, 0 for an empty hand, inf when it can never be emptied
+    """
+    if len(hand) == 0:
+        return 0.0
+    hand = tuple(sorted(hand))
+    unseen = TOTAL_CARD_COUNT - len(hand)
+    cost = 0.0
+    for cluster in _clusters(hand):
+        cost = _overlapping_wait(cost, _hand_cost(*canonical_position(cluster, _relevant(hand, cluster))))
+    # the groups that can already be disposed still take one turn
+    return max(1.0, cost * unseen / DRAWS_PER_TURN)
+
+
+def best_group_to_dispose(hand):
+    """
+    :param hand: card indices, see card_to_index
+    :return: the valid group in the hand that leaves the hand quickest to empty, the larger group on a tie, None when
+    the hand holds no valid group
+    """
+    best = None
+    for group in {group for index in set(hand) for group in _groups_containing(index)}:
+        rest = list(hand)
+        try:
+            for index in group:
+                rest.remove(index)
+        except ValueError:
+            continue
+        score = (turns_to_empty(rest), -len(group))
+        if best is None or score < best[0]:
+            best = (score, group)
+    return None if best is None else best[1]